@@ -8,6 +8,8 @@ Run this once to get your tokens, then add them to your .env file
 import os
 import base64
 import hashlib
+import secrets
+import time
 import webbrowser
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import urllib.parse
@@ -22,9 +24,13 @@ SCOPES = [
     "streamkey:read", "events:subscribe"
 ]
 
+# Shared HTTP session so repeated calls to id.kick.com reuse the same keep-alive connection
+_HTTP = requests.Session()
+
 def generate_pkce_pair():
     """Generate PKCE code verifier and challenge"""
-    verifier = base64.urlsafe_b64encode(os.urandom(40)).rstrip(b'=').decode('utf-8')
+    # 40 random bytes -> 54 URL-safe characters, within PKCE's 43-128 character range
+    verifier = secrets.token_urlsafe(40)
     challenge = base64.urlsafe_b64encode(
         hashlib.sha256(verifier.encode('utf-8')).digest()
     ).rstrip(b'=').decode('utf-8')
@@ -34,8 +40,14 @@ class OAuthCallbackHandler(BaseHTTPRequestHandler):
     """Handle OAuth callback from Kick"""
     def do_GET(self):
         parsed = urllib.parse.urlparse(self.path)
+        if parsed.path != "/callback":
+            # e.g. the browser asking for /favicon.ico
+            self.send_response(404)
+            self.end_headers()
+            return
         query = urllib.parse.parse_qs(parsed.query)
         self.server.auth_code = query.get("code", [None])[0]
+        self.server.callback_received = True
 
         self.send_response(200)
         self.end_headers()
@@ -45,11 +57,23 @@ class OAuthCallbackHandler(BaseHTTPRequestHandler):
         """Suppress server logs"""
         pass
 
-def run_local_server():
-    """Run local server to catch OAuth callback"""
+def create_callback_server():
+    """Bind the local callback server; done before opening the browser so the redirect can't beat it"""
     server = HTTPServer(("localhost", 8080), OAuthCallbackHandler)
+    server.timeout = 5  # Wake up periodically so the overall wait below can expire
+    server.auth_code = None
+    server.callback_received = False
+    return server
+
+def run_local_server(server, wait_seconds=300):
+    """Serve requests until the OAuth callback arrives or wait_seconds pass"""
     print("✅ Waiting for authorization callback...")
-    server.handle_request()
+    deadline = time.monotonic() + wait_seconds
+    try:
+        while not server.callback_received and time.monotonic() < deadline:
+            server.handle_request()
+    finally:
+        server.server_close()
     return server.auth_code
 
 def exchange_code_for_token(code, verifier):
@@ -66,26 +90,25 @@ def exchange_code_for_token(code, verifier):
     headers = {
         "Content-Type": "application/x-www-form-urlencoded"
     }
-    response = requests.post(token_url, data=payload, headers=headers)
+    response = _HTTP.post(token_url, data=payload, headers=headers, timeout=10)
     return response.json()
 
 def save_to_env_file(token_data):
     """Save tokens to .env file"""
     env_path = ".env"
     
-    # Read existing .env file
-    env_content = ""
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            env_content = f.read()
-    
     # Update Kick tokens
     access_token = token_data.get('access_token', '')
     refresh_token = token_data.get('refresh_token', '')
     
-    # Remove existing Kick token lines
-    lines = env_content.split('\n')
-    lines = [line for line in lines if not line.startswith(('KICK_ACCESS_TOKEN=', 'KICK_REFRESH_TOKEN='))]
+    # Keep existing non-empty lines except the old Kick tokens, in a single pass
+    lines = []
+    if os.path.exists(env_path):
+        with open(env_path, 'r') as f:
+            lines = [
+                line for line in f.read().splitlines()
+                if line.strip() and not line.startswith(('KICK_ACCESS_TOKEN=', 'KICK_REFRESH_TOKEN='))
+            ]
     
     # Add new Kick tokens
     lines.append(f"KICK_ACCESS_TOKEN={access_token}")
@@ -93,7 +116,7 @@ def save_to_env_file(token_data):
     
     # Write back to .env file
     with open(env_path, 'w') as f:
-        f.write('\n'.join(line for line in lines if line.strip()))
+        f.write('\n'.join(lines) + '\n')
     
     print(f"✅ Tokens saved to {env_path}")
 
@@ -116,7 +139,7 @@ def main():
     # Generate PKCE
     verifier, challenge = generate_pkce_pair()
     scope_str = " ".join(SCOPES)
-    state = base64.urlsafe_b64encode(os.urandom(16)).decode()
+    state = secrets.token_urlsafe(16)
 
     # Build authorization URL
     auth_url = (
@@ -130,11 +153,12 @@ def main():
         f"&state={state}"
     )
 
+    server = create_callback_server()
     print("🔗 Opening browser to authenticate with Kick...")
     webbrowser.open(auth_url)
 
     # Get authorization code
-    code = run_local_server()
+    code = run_local_server(server)
     if not code:
         print("❌ Authorization code not received.")
         return
@@ -1,13 +1,34 @@
 import re
+import json
+import string
+import hashlib
+import sqlite3
 import logging
-from typing import Dict, Optional, Tuple, List
-from dataclasses import dataclass
-from openai import OpenAI
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Callable, ClassVar, Dict, Optional, Tuple, List
+from dataclasses import dataclass, replace
+from openai import AsyncOpenAI
 from .config import Config
-import json
 
 logger = logging.getLogger(__name__)
 
+# orjson parses the AI tool-call arguments noticeably faster; fall back to the stdlib parser
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Optional local intent classifier for argument-free commands (see LOCAL_INTENT_MODEL)
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    EMBEDDINGS_AVAILABLE = True
+except ImportError:
+    EMBEDDINGS_AVAILABLE = False
+
 # --- Add this utility class ---
 class CommandSessionLogger:
     def __init__(self, platform, action, spoken_username):
@@ -49,7 +70,7 @@ class CommandSessionLogger:
         logger.info(f"[EXECUTE] {self.platform}: {' | '.join(parts)} ... {status}")
 # --- End utility class ---
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ModerationCommand:
     action: str  # 'ban', 'timeout', 'unban', 'clear', 'slow', 'followers_only', 'subscribers_only', 'weather', etc.
     username: Optional[str] = None
@@ -59,22 +80,396 @@ class ModerationCommand:
     original_username: Optional[str] = None  # Store the original spoken username
     weather_location: Optional[str] = None  # Store weather location for weather commands
     username_resolved: bool = False  # Track if username was successfully resolved from recent chat
+    platform_usernames: Optional[Dict] = None  # {Platform: resolved username} where the username was found
+
+SUPPORTED_ACTIONS = (
+    'ban', 'unban', 'timeout', 'untimeout', 'clear', 'slow', 'slow_off',
+    'followers_only', 'followers_off', 'subscribers_only', 'subscribers_off',
+    'emote_only', 'emote_off', 'restrict', 'unrestrict', 'weather'
+)
+
+# Commands that require a username
+USER_REQUIRED_ACTIONS = frozenset({'ban', 'unban', 'timeout', 'untimeout', 'restrict', 'unrestrict'})
+# Commands that pose danger if username is not verified (can affect innocent users)
+DANGEROUS_ACTIONS = frozenset({'ban', 'timeout', 'restrict'})
+# Commands that require a weather location
+WEATHER_REQUIRED_ACTIONS = frozenset({'weather'})
+# Commands that can have durations
+DURATION_ALLOWED_ACTIONS = frozenset({'timeout', 'slow', 'followers_only'})
+
+# Function-calling schema for the AI parser; the model is forced to call it, and strict mode
+# (structured outputs) guarantees the arguments are valid JSON with exactly these fields
+_PARSE_COMMAND_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "parse_moderation_command",
+        "description": "Record the moderation action contained in a voice command",
+        "strict": True,
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "action": {"type": "string", "enum": [*SUPPORTED_ACTIONS, "unknown"]},
+                "username": {"type": ["string", "null"], "description": "Target username, if applicable"},
+                "duration": {"type": ["integer", "null"], "description": "Duration in seconds, if applicable"},
+                "reason": {"type": ["string", "null"], "description": "Reason for the action, if mentioned"},
+                "weather_location": {"type": ["string", "null"], "description": "Location for weather commands"},
+            },
+            "required": ["action", "username", "duration", "reason", "weather_location"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+_PARSE_COMMANDS_BATCH_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "parse_moderation_commands",
+        "description": "Record the moderation action of each voice command, in input order",
+        "strict": True,
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": _PARSE_COMMAND_TOOL["function"]["parameters"],
+                },
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+_json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+# Every template contains at least one of these substrings ("unban" contains "ban", etc.),
+# so text without any of them can skip the regex entirely
+_TEMPLATE_KEYWORDS = ('ban', 'ben', 'timeout', 'mute', 'restrict', 'clear', 'slow', 'follower', 'sub', 'emote')
+_GROUP_NAME_RE = re.compile(r'\(\?P<(\w+)>')
+# Time unit suffix accepted after a spoken duration ("10 minutes", "30 secs")
+_UNIT = r'(?P<unit>seconds?|secs?|minutes?|mins?|hours?|hrs?|days?|weeks?)'
+# A "for ..." remainder that looks like a spelled-out duration ("for an hour", "for five
+# minutes") is not a reason; the templates only parse digits, so those go to OpenAI
+_SPOKEN_DURATION_RE = re.compile(
+    r'^(?:a|an|one|two|three|four|five|six|seven|eight|nine|ten|half|couple|few)\b'
+    r'|\b(?:seconds?|secs?|minutes?|mins?|hours?|hrs?|days?|weeks?)\b'
+)
+
+# Example phrasings per action for the local intent classifier. Only actions without arguments
+# are answered locally; the rest are listed so commands that name a user, duration or place land
+# on them and still go to OpenAI, which can extract those fields.
+_INTENT_PHRASES = {
+    'clear': ('clear the chat', 'wipe the chat', 'delete all chat messages'),
+    'slow_off': ('turn off slow mode', 'disable slow mode', 'stop slow mode'),
+    'followers_off': ('turn off followers only mode', 'disable followers only', 'let everyone chat again'),
+    'subscribers_only': ('subscribers only mode', 'only subs can chat', 'turn on sub only mode'),
+    'subscribers_off': ('turn off subscribers only mode', 'disable sub only mode'),
+    'emote_only': ('emote only mode', 'only emotes in chat', 'turn on emote only'),
+    'emote_off': ('turn off emote only mode', 'disable emote only'),
+    'ban': ('ban this user', 'permanently ban someone'),
+    'unban': ('unban this user', 'remove the ban on someone'),
+    'timeout': ('timeout this user for ten minutes', 'mute someone for a while'),
+    'untimeout': ('remove the timeout on this user', 'untimeout someone'),
+    'restrict': ('restrict this user',),
+    'unrestrict': ('unrestrict this user',),
+    'slow': ('enable slow mode for thirty seconds', 'turn on slow mode'),
+    'followers_only': ('followers only mode for ten minutes', 'turn on followers only'),
+    'weather': ('what is the weather in london', 'change the weather location'),
+}
+_LOCAL_INTENT_ACTIONS = frozenset({
+    'clear', 'slow_off', 'followers_off', 'subscribers_only', 'subscribers_off', 'emote_only', 'emote_off',
+})
+
+# Separators between commands spoken in one breath ("ban x, timeout y and then clear chat")
+_COMPOUND_SPLIT_RE = re.compile(r'\s*(?:[,;]|\band\s+then\b|\bthen\b|\band\b)\s*', re.IGNORECASE)
+# First words that start a command; a compound utterance is only split if every part starts with one
+_COMMAND_LEAD_WORDS = frozenset({
+    'ban', 'unban', 'unben', 'permanently', 'timeout', 'untimeout', 'mute', 'restrict', 'unrestrict',
+    'clear', 'slow', 'follower', 'followers', 'sub', 'subs', 'subscriber', 'subscribers',
+    'emote', 'emotes', 'enable', 'disable', 'turn', 'remove',
+})
+
+# A complete "username" string in a partially streamed tool-call argument object
+_PARTIAL_USERNAME_RE = re.compile(r'"username"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# Marks that username resolution hasn't run yet ((None, None) is a valid "not found" result)
+_NOT_RESOLVED = object()
+
+
+class _JsonObjectTracker:
+    """Follows brace depth across streamed JSON fragments to tell when the top-level object closes"""
+    
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+    
+    def feed(self, fragment: str) -> bool:
+        """Consume a fragment; return True once the outermost object has been closed"""
+        for ch in fragment:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == '{':
+                self.depth += 1
+            elif ch == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        return False
+
+# Translation table deleting every character allowed in a username; a valid name translates to ''
+_USERNAME_CHARS_TABLE = str.maketrans('', '', string.ascii_letters + string.digits + '_')
+
+# Seconds per time unit, keyed by the singular stem of what _UNIT captures ("mins" -> "min")
+TIME_UNITS = {
+    'sec': 1, 'second': 1,
+    'min': 60, 'minute': 60,
+    'hr': 3600, 'hour': 3600,
+    'day': 86400,
+    'week': 604800,
+}
 
 class CommandProcessor:
+    # Static instructions for the AI parser. Only the user message (the command itself) varies
+    # between calls, so this prefix stays byte-identical and OpenAI's prompt caching can reuse it.
+    # Keep it free of interpolated settings; defaults are applied in _ai_process_command instead.
+    SYSTEM_PROMPT: ClassVar[str] = """You are a Twitch chat moderation assistant. The user message is a voice command; record its moderation action with parse_moderation_command.
+
+Rules for parsing:
+1. BANS are PERMANENT - never set duration for "ban" action, always null
+2. For "timeout" without duration: leave duration null (the default is applied afterwards)
+3. For "slow mode" without duration: use 10 seconds as default
+4. For "followers_only" default duration is 1 second. Otherwise, use the duration provided.
+5. Convert time units: minutes->seconds (*60), hours->seconds (*3600), days->seconds (*86400), weeks->seconds (*604800)
+6. Clean usernames: lowercase, no spaces, alphanumeric + underscore only
+7. Pay attention to opposite actions: "unban" vs "ban", "untimeout" vs "timeout", etc.
+8. For unclear commands, use "unknown" action
+9. Only these actions can have durations: timeout, slow, followers_only
+10. Always convert weather country to abbreviation. Example: "United States" -> "US" or "United Kingdom" -> "UK" or "Italy" -> "IT"
+
+Command variations to recognize:
+- "ban", "permanently ban", "band", "bend" -> ban (always permanent, duration = null)
+- "timeout", "mute" -> timeout (with duration)
+- "unban", "unben" -> remove ban
+- "untimeout", "un tie mount", "remove timeout" -> remove timeout
+- "clear chat", "clear the chat" -> clear
+- "slow mode", "enable slow mode" -> slow
+- "disable slow mode", "turn off slow mode", "slow off" -> slow_off
+- "followers only", "follower mode" -> followers_only
+- "disable followers only", "followers off", "remove followers only" -> followers_off
+- "subscribers only", "sub mode", "subs only", "sub only" -> subscribers_only
+- "disable subscribers only", "subs off", "sub off", "remove sub only", "remove subs only", "turn off sub only", "turn off subs only", "disable sub only", "disable sub mode" -> subscribers_off
+- "emote only", "emotes only" -> emote_only
+- "disable emote only", "emotes off", "remove emote only" -> emote_off
+- "restrict user", "put user in restricted mode" -> restrict
+- "unrestrict user", "remove restrictions" -> unrestrict
+- "change weather to [location]", "set weather to [location]", "weather location [location]" -> weather
+- "set the weather", "change the weather" (without location) -> unknown (incomplete command)
+
+Examples:
+"ban johndoe" -> action=ban, username=johndoe
+"permanently ban user123" -> action=ban, username=user123
+"timeout user123 for 10 minutes" -> action=timeout, username=user123, duration=600
+"unban johndoe" -> action=unban, username=johndoe
+"untimeout user123" -> action=untimeout, username=user123
+"clear the chat" -> action=clear
+"slow mode" -> action=slow, duration=10
+"slow mode 30 seconds" -> action=slow, duration=30
+"disable slow mode" -> action=slow_off
+"followers only 10 minutes" -> action=followers_only, duration=600
+"followers only mode" -> action=followers_only, duration=1
+"turn off followers only" -> action=followers_off
+"remove followers only" -> action=followers_off
+"subscribers only" -> action=subscribers_only
+"sub only" -> action=subscribers_only
+"subs only mode" -> action=subscribers_only
+"disable subs only" -> action=subscribers_off
+"remove sub only" -> action=subscribers_off
+"turn off sub only" -> action=subscribers_off
+"emote only mode" -> action=emote_only
+"turn off emote only" -> action=emote_off
+"restrict baduser" -> action=restrict, username=baduser
+"unrestrict gooduser" -> action=unrestrict, username=gooduser
+"change weather to Naples, Italy" -> action=weather, weather_location="Naples, IT"
+"set weather to Tokyo, Japan" -> action=weather, weather_location="Tokyo, JP"
+"set the weather" -> action=unknown
+"change the weather" -> action=unknown
+"""
+    BATCH_PROMPT: ClassVar[str] = (
+        "The user message is a JSON array of voice commands instead of a single one. "
+        "Call parse_moderation_commands with exactly one result per command, in the same order."
+    )
+    
     def __init__(self, phonetic_helper=None):
         """Initialize the command processor with AI capabilities and optional phonetic matching"""
         self.openai_client = None
         self.phonetic_helper = phonetic_helper
+        # Duration settings are fixed once the process starts; read them off Config only once
+        self._default_timeout = Config.DEFAULT_TIMEOUT_DURATION
+        self._max_timeout = Config.MAX_TIMEOUT_DURATION
+        self._max_followers_only = Config.MAX_FOLLOWERS_ONLY_DURATION
+        self._intent_threshold = Config.LOCAL_INTENT_THRESHOLD
+        
+        # Local fast path for the common, templated commands. Patterns run against the
+        # lowercased command; anything they don't fully match falls through to OpenAI.
+        # Fields are captured as named groups: username, dur, unit and rest (trailing words)
+        raw_patterns = {
+            'unban': [r'^(?:unban|unben)\s+(?P<username>\w+)$'],
+            'untimeout': [r'^(?:untimeout|remove\s+(?:the\s+)?timeout(?:\s+(?:for|on|from))?)\s+(?!(?:for|on|from)$)(?P<username>\w+)$'],
+            'unrestrict': [r'^unrestrict\s+(?P<username>\w+)$'],
+            'restrict': [r'^restrict\s+(?P<username>\w+)$'],
+            'ban': [r'^(?:permanently\s+)?ban\s+(?P<username>\w+)(?:\s+(?P<rest>.+))?$'],
+            'timeout': [r'^(?:timeout|mute)\s+(?P<username>\w+)(?:\s+(?:for\s+)?(?P<dur>\d+)\s*' + _UNIT + r')?(?:\s+(?P<rest>.+))?$'],
+            'clear': [r'^clear\s+(?:the\s+)?chat$'],
+            'slow_off': [r'^(?:disable|turn\s+off)\s+slow\s+mode$', r'^slow\s+(?:mode\s+)?off$'],
+            'slow': [r'^(?:enable\s+|turn\s+on\s+)?slow\s+mode(?:\s+(?:for\s+)?(?P<dur>\d+)\s*' + _UNIT + r')?$'],
+            'followers_off': [r'^(?:disable|turn\s+off|remove)\s+followers?\s+only(?:\s+mode)?$', r'^followers\s+off$'],
+            'followers_only': [r'^(?:enable\s+|turn\s+on\s+)?followers?\s+(?:only(?:\s+mode)?|mode)(?:\s+(?:for\s+)?(?P<dur>\d+)\s*' + _UNIT + r')?$'],
+            'subscribers_off': [r'^(?:disable|turn\s+off|remove)\s+(?:subscribers?|subs?)\s+(?:only|mode)(?:\s+mode)?$', r'^subs?\s+off$'],
+            'subscribers_only': [r'^(?:enable\s+|turn\s+on\s+)?(?:subscribers?|subs?)\s+only(?:\s+mode)?$', r'^sub\s+mode$'],
+            'emote_off': [r'^(?:disable|turn\s+off|remove)\s+emotes?\s+only(?:\s+mode)?$', r'^emotes?\s+off$'],
+            'emote_only': [r'^(?:enable\s+|turn\s+on\s+)?emotes?\s+only(?:\s+mode)?$'],
+        }
+        self.command_patterns = raw_patterns
+        # Fuse every template into one master regex so a single search both picks the action
+        # and extracts its fields. Each action is wrapped in a group named after it and its
+        # field groups are prefixed "<action>__" to keep names unique; alternatives keep the
+        # dict order above, so e.g. "unban" is still tried before "ban".
+        alternatives = []
+        # (group name, field) pairs each action can fill, resolved up front so extraction
+        # reads only its own groups instead of scanning the whole groupdict
+        self._action_fields = {}
+        for action, patterns in raw_patterns.items():
+            prefixed = [_GROUP_NAME_RE.sub(f'(?P<{action}__\\1>', p) for p in patterns]
+            body = '|'.join(f'(?:{p})' for p in prefixed)
+            alternatives.append(f'(?P<{action}>{body})')
+            fields = dict.fromkeys(name for p in patterns for name in _GROUP_NAME_RE.findall(p))
+            self._action_fields[action] = tuple((f'{action}__{field}', field) for field in fields)
+        self.master_re = re.compile('|'.join(alternatives), re.IGNORECASE)
+        self._master_search = self.master_re.search
+        # Applied to whatever follows the username; a trailing remainder that isn't a reason
+        # means the command is more complex than the templates, so it goes to OpenAI instead
+        self._reason_re = re.compile(
+            r'^(?:reason[:\s]+(?P<r1>.+)|because\s+(?P<r2>.+)|for\s+(?!\d)(?P<r3>.+))$',
+            re.IGNORECASE
+        )
+        
+        # Streamers repeat the same commands all session; remember what the AI made of them
+        self._ai_parse_cache: "OrderedDict[str, Optional[Tuple]]" = OrderedDict()
+        self._ai_parse_cache_size = 512
+        # The username helpers aren't thread-safe; every worker-thread resolution holds this lock
+        self._resolve_lock = asyncio.Lock()
+        # Only commands the templates couldn't handle reach the model, and the forced tool call
+        # is a handful of short fields, so a small fast model with a tight token cap is enough
+        self._ai_model = "gpt-4o-mini"
+        self._ai_max_tokens = 80
+        # The same commands come back every stream, so parses also persist on disk across restarts.
+        # Keys are salted with the model and prompt so changing either starts a fresh cache.
+        self._disk_cache_key_base = hashlib.sha1(f"{self._ai_model}\n{self.SYSTEM_PROMPT}\n".encode())
+        self._disk_cache = self._open_disk_cache(Config.AI_PARSE_CACHE_PATH)
+        # The connection is used from worker threads (asyncio.to_thread), one statement at a time
+        self._disk_cache_lock = threading.Lock()
+        self._intent_model = None
+        self._intent_actions: Tuple[str, ...] = ()
+        self._intent_centroids = None
+        if Config.LOCAL_INTENT_MODEL:
+            self._load_intent_model(Config.LOCAL_INTENT_MODEL)
         if Config.OPENAI_API_KEY:
-            self.openai_client = OpenAI(api_key=Config.OPENAI_API_KEY)
+            self.openai_client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
         else:
             logger.error("OpenAI API key not found. Command processing will not work.")
     
+    def _open_disk_cache(self, path: str) -> Optional[sqlite3.Connection]:
+        """Open the SQLite cache of AI parses, or return None if it is disabled or unavailable"""
+        if not path:
+            return None
+        try:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS ai_parses (key TEXT PRIMARY KEY, parsed TEXT NOT NULL)")
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            logger.warning(f"AI parse cache disabled, could not open '{path}': {e}")
+            return None
+    
+    def _load_intent_model(self, model_name: str):
+        """Load the local embedding model and one normalized centroid per action"""
+        if not EMBEDDINGS_AVAILABLE:
+            logger.warning("Local intent classifier not available. Install with: pip install sentence-transformers")
+            return
+        try:
+            model = SentenceTransformer(model_name)
+            actions = tuple(_INTENT_PHRASES)
+            centroids = np.stack([
+                model.encode(list(_INTENT_PHRASES[action]), normalize_embeddings=True).mean(axis=0)
+                for action in actions
+            ])
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        except Exception as e:
+            logger.error(f"Failed to load local intent model '{model_name}': {e}")
+            return
+        self._intent_model = model
+        self._intent_actions = actions
+        self._intent_centroids = centroids
+        logger.info(f"🧠 Local intent classifier loaded: {model_name}")
+    
+    def _classify_command(self, command_text: str) -> Optional[ModerationCommand]:
+        """
+        Answer argument-free commands with the local embedding classifier
+        
+        Returns None (so the command goes to OpenAI) when the nearest action takes arguments
+        or the similarity is below LOCAL_INTENT_THRESHOLD.
+        """
+        embedding = self._intent_model.encode([command_text], normalize_embeddings=True)[0]
+        scores = self._intent_centroids @ embedding
+        best = int(scores.argmax())
+        action = self._intent_actions[best]
+        if action not in _LOCAL_INTENT_ACTIONS or scores[best] < self._intent_threshold:
+            return None
+        logger.debug(f"Local intent match: {action} ({scores[best]:.2f})")
+        return ModerationCommand(action=action)
+    
+    def _disk_cache_key(self, command_text: str) -> str:
+        """Hash a command together with the model and prompt it was parsed with"""
+        key = self._disk_cache_key_base.copy()
+        key.update(command_text.encode())
+        return key.hexdigest()
+    
+    def _disk_cache_get(self, disk_key: str) -> Optional[Tuple]:
+        """Look up a cached parse on disk; blocking, so run it in a worker thread"""
+        try:
+            with self._disk_cache_lock:
+                row = self._disk_cache.execute("SELECT parsed FROM ai_parses WHERE key = ?", (disk_key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"AI parse cache lookup failed: {e}")
+            return None
+        # Rows written as null (unknown commands) by older versions count as misses
+        fields = _json_loads(row[0]) if row is not None else None
+        return tuple(fields) if fields is not None else None
+    
+    def _disk_cache_put(self, disk_key: str, parsed: Tuple):
+        """Store a parse on disk; blocking, so run it in a worker thread"""
+        try:
+            with self._disk_cache_lock:
+                self._disk_cache.execute(
+                    "INSERT OR REPLACE INTO ai_parses (key, parsed) VALUES (?, ?)",
+                    (disk_key, json.dumps(parsed))
+                )
+                self._disk_cache.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"AI parse cache write failed: {e}")
+    
     def set_phonetic_helper(self, phonetic_helper):
         """Set the phonetic helper for username resolution"""
         self.phonetic_helper = phonetic_helper
     
-    def process_command(self, command_text: str) -> Optional[ModerationCommand]:
+    async def process_command(self, command_text: str) -> Optional[ModerationCommand]:
         """
         Process a voice command using OpenAI API and phonetic username matching
         
@@ -88,11 +483,119 @@ class CommandProcessor:
         # [VOICE] log
         # logger.info(f"Processing command: {command_text}")
         
-        if not self.openai_client:
+        moderation_cmd = self._pattern_match_command(command_text)
+        if moderation_cmd is None and self._intent_model is not None:
+            moderation_cmd = await asyncio.to_thread(self._classify_command, command_text)
+        early_resolutions = {}
+        if moderation_cmd is None:
+            if not self.openai_client:
+                logger.error("OpenAI client not available")
+                return None
+            
+            def resolve_early(username: str):
+                # Start matching the username against recent chat while the rest of the AI response streams in
+                if username not in early_resolutions:
+                    early_resolutions[username] = asyncio.ensure_future(self._in_resolve_thread(self._resolve_username, username))
+            
+            moderation_cmd = await self._ai_process_command(command_text, on_username=resolve_early)
+        
+        resolution = _NOT_RESOLVED
+        if moderation_cmd and moderation_cmd.username in early_resolutions:
+            resolution = await early_resolutions[moderation_cmd.username]
+        # Username resolution may call out to the platform AI helpers synchronously,
+        # so keep it off the event loop
+        return await self._in_resolve_thread(self._finalize_command, command_text, moderation_cmd, resolution)
+    
+    def split_compound_command(self, command_text: str) -> List[str]:
+        """
+        Split an utterance holding several commands ("ban x, timeout y and clear chat") into parts
+        
+        Splits whenever every part starts like a command, even if the whole text would also
+        match a template: "timeout bob for being rude, then clear chat" must not become one
+        timeout whose reason swallowed the second command. Reasons such as "for spamming and
+        trolling" stay attached because "trolling" doesn't start a command.
+        Returns [command_text] when the utterance should be handled as one command.
+        """
+        parts = [part for part in _COMPOUND_SPLIT_RE.split(command_text.strip()) if part]
+        if len(parts) < 2:
+            return [command_text]
+        for part in parts:
+            if part.split(None, 1)[0].lower() not in _COMMAND_LEAD_WORDS:
+                return [command_text]
+        return parts
+    
+    async def process_commands(self, command_texts: List[str]) -> List[Optional[ModerationCommand]]:
+        """
+        Process several voice commands at once, e.g. a burst of queued transcripts
+        
+        Commands the templates can't handle are sent to OpenAI together in a single request
+        instead of one round-trip each.
+        
+        Args:
+            command_texts: The recognized voice command texts
+            
+        Returns:
+            One ModerationCommand (or None if not recognized) per input, in the same order
+        """
+        command_texts = [text.strip() for text in command_texts]
+        commands = [self._pattern_match_command(text) for text in command_texts]
+        if self._intent_model is not None:
+            for i, text in enumerate(command_texts):
+                if commands[i] is None:
+                    commands[i] = await asyncio.to_thread(self._classify_command, text)
+        
+        misses = [i for i, cmd in enumerate(commands) if cmd is None]
+        if misses and self.openai_client:
+            # Serve repeated and previously seen commands from the parse caches; only the
+            # remaining distinct commands go to OpenAI, together in one request
+            parsed_by_key = {}
+            uncached = {}  # cache key -> command text to send
+            for i in misses:
+                key = self._ai_cache_key(command_texts[i])
+                if key in parsed_by_key or key in uncached:
+                    continue
+                found, parsed = await self._ai_cache_get(key)
+                if found:
+                    parsed_by_key[key] = parsed
+                else:
+                    uncached[key] = command_texts[i]
+            if uncached:
+                try:
+                    parsed_list = await self._ai_parse_batch(list(uncached.values()))
+                except Exception as e:
+                    logger.error(f"AI batch command processing failed: {e}")
+                else:
+                    for key, parsed in zip(uncached, parsed_list):
+                        await self._ai_cache_put(key, parsed)
+                        parsed_by_key[key] = parsed
+            for i in misses:
+                parsed = parsed_by_key.get(self._ai_cache_key(command_texts[i]))
+                if parsed is not None:
+                    commands[i] = self._command_from_parsed(parsed)
+        elif misses:
             logger.error("OpenAI client not available")
-            return None
         
-        moderation_cmd = self._ai_process_command(command_text)
+        # Username resolution is blocking, so it runs in a worker thread, one command after
+        # another: resolutions must not run concurrently against the helpers
+        return await self._in_resolve_thread(self._finalize_commands, command_texts, commands)
+    
+    async def _in_resolve_thread(self, func, *args):
+        """Run a call that may resolve usernames in a worker thread, one such call at a time"""
+        async with self._resolve_lock:
+            return await asyncio.to_thread(func, *args)
+    
+    def _finalize_commands(self, command_texts: List[str],
+                           commands: List[Optional[ModerationCommand]]) -> List[Optional[ModerationCommand]]:
+        """_finalize_command for each command of a burst, in order, resolving its usernames in one batch"""
+        resolutions = self._resolve_usernames([cmd.username for cmd in commands if cmd and cmd.username])
+        return [
+            self._finalize_command(text, cmd, resolutions[cmd.username] if cmd and cmd.username else _NOT_RESOLVED)
+            for text, cmd in zip(command_texts, commands)
+        ]
+    
+    def _finalize_command(self, command_text: str, moderation_cmd: Optional[ModerationCommand],
+                          resolution=_NOT_RESOLVED) -> Optional[ModerationCommand]:
+        """Log a parsed command and resolve its username against recent chat, unless already resolved"""
         session_logger = None
         if moderation_cmd and moderation_cmd.username:
             # [CMD] log
@@ -105,25 +608,30 @@ class CommandProcessor:
             session_logger.log_cmd(moderation_cmd)
             # Try to resolve the username using phonetic matching
             original_username = moderation_cmd.username
-            resolved_username = self._resolve_username(moderation_cmd.username)
+            if resolution is _NOT_RESOLVED:
+                resolution = self._resolve_username(moderation_cmd.username)
+            resolved_username, platform_usernames = resolution
             if resolved_username and resolved_username != original_username:
                 # Username was successfully resolved from recent chat
-                moderation_cmd.username = resolved_username
-                moderation_cmd.original_username = original_username
-                moderation_cmd.username_resolved = True
+                moderation_cmd = replace(
+                    moderation_cmd,
+                    username=resolved_username,
+                    original_username=original_username,
+                    username_resolved=True,
+                    platform_usernames=platform_usernames
+                )
                 # [RESOLVE] log
                 session_logger.log_resolve(resolved_username)
                 # logger.info(f"Username resolved: '{original_username}' -> '{resolved_username}'")
             elif resolved_username == original_username:
-                moderation_cmd.username_resolved = True
+                moderation_cmd = replace(moderation_cmd, username_resolved=True, platform_usernames=platform_usernames)
                 # [RESOLVE] log (exact match)
                 session_logger.log_resolve(resolved_username)
                 # logger.info(f"Exact username match found in recent chat: '{original_username}'")
             else:
                 # Username could not be resolved from recent chat
                 logger.warning(f"Could not resolve username from recent chat: '{original_username}'")
-                moderation_cmd.original_username = original_username
-                moderation_cmd.username_resolved = False
+                moderation_cmd = replace(moderation_cmd, original_username=original_username, username_resolved=False)
                 # Keep the original username for validation to catch this as an error
         elif moderation_cmd:
             # For commands without username (e.g., clear chat)
@@ -138,145 +646,265 @@ class CommandProcessor:
             logger.warning(f"Could not process command: {command_text}")
             return None
     
-    def _resolve_username(self, spoken_username: str) -> Optional[str]:
-        """Resolve a spoken username using AI matching across all available platforms"""
+    def _resolve_username(self, spoken_username: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Resolve a spoken username using AI matching across all available platforms
+        
+        Returns:
+            (resolved username or None, {platform: username} where it matched, or None for
+            single-platform helpers)
+        """
         if not self.phonetic_helper:
             logger.debug("No AI username helper available, cannot verify username from recent chat")
-            return None
+            return None, None
         
         try:
-            # If it's a multi-platform manager, try to resolve across all platforms
-            if hasattr(self.phonetic_helper, 'resolve_username_across_platforms'):
-                resolved = self.phonetic_helper.resolve_username_across_platforms(spoken_username)
-                if resolved:
-                    return resolved
+            # If it's a multi-platform manager, resolve on every platform and keep each match
+            if hasattr(self.phonetic_helper, 'resolve_username_map'):
+                platform_usernames = self.phonetic_helper.resolve_username_map(spoken_username)
+                if platform_usernames:
+                    return next(iter(platform_usernames.values())), platform_usernames
+                return None, None
             
             # Fallback to single platform resolution
-            resolved = self.phonetic_helper.resolve_username(spoken_username)
-            return resolved
+            return self.phonetic_helper.resolve_username(spoken_username), None
         except Exception as e:
             logger.error(f"Error resolving username '{spoken_username}': {e}")
+            return None, None
+    
+    def _resolve_usernames(self, spoken_usernames: List[str]) -> Dict[str, Tuple[Optional[str], Optional[Dict]]]:
+        """_resolve_username for several names, through the helper's batch resolution when it has one"""
+        if self.phonetic_helper and hasattr(self.phonetic_helper, 'resolve_usernames_batch'):
+            try:
+                batch = self.phonetic_helper.resolve_usernames_batch(spoken_usernames)
+                return {
+                    name: (next(iter(platform_usernames.values())), platform_usernames) if platform_usernames else (None, None)
+                    for name, platform_usernames in batch.items()
+                }
+            except Exception as e:
+                logger.error(f"Error resolving usernames {spoken_usernames}: {e}")
+                return dict.fromkeys(spoken_usernames, (None, None))
+        return {name: self._resolve_username(name) for name in spoken_usernames}
+    
+    def _pattern_match_command(self, command_text: str) -> Optional[ModerationCommand]:
+        """Match the command against the precompiled templates, returning None on a miss"""
+        # Transcripts are often lowercase already; skip the copy lower() would make.
+        # The normalized text feeds both the keyword prefilter and the regex search.
+        normalized = command_text if command_text.islower() else command_text.lower()
+        normalized = normalized.rstrip('.!?').strip()
+        if not any(keyword in normalized for keyword in _TEMPLATE_KEYWORDS):
+            return None
+        match = self._master_search(normalized)
+        if not match:
             return None
+        # The enclosing action group is always the last one to close
+        cmd = self._extract_command_from_match(match, match.lastgroup)
+        if cmd:
+            logger.debug(f"Pattern matched command: {cmd}")
+        return cmd
     
-    def _ai_process_command(self, command_text: str) -> Optional[ModerationCommand]:
+    def _extract_command_from_match(self, match: re.Match, action: str) -> Optional[ModerationCommand]:
+        """Build a ModerationCommand from the named groups of a template match"""
+        fields = {}
+        for group, field in self._action_fields[action]:
+            value = match.group(group)
+            if value is not None:
+                fields[field] = value
+        username = fields.get('username')
+        rest = fields.get('rest')
+        reason = None
+        duration = None
+        
+        if fields.get('dur'):
+            duration = int(fields['dur']) * TIME_UNITS.get(fields.get('unit', '').rstrip('s'), 60)
+        elif action == 'timeout':
+            duration = self._default_timeout
+        elif action == 'slow':
+            duration = 10
+        elif action == 'followers_only':
+            duration = 1
+        
+        if rest:
+            reason_match = self._reason_re.match(rest)
+            if not reason_match:
+                # Unrecognised trailing words - let the AI interpret the whole command
+                return None
+            if reason_match.group('r3') and _SPOKEN_DURATION_RE.search(reason_match.group('r3')):
+                return None
+            reason = (reason_match.group('r1') or reason_match.group('r2') or reason_match.group('r3')).strip()
+        
+        return ModerationCommand(action=action, username=username, duration=duration, reason=reason)
+    
+    async def _ai_process_command(self, command_text: str,
+                                  on_username: Optional[Callable[[str], None]] = None) -> Optional[ModerationCommand]:
         """Use OpenAI to process all commands"""
         try:
-            prompt = f"""
-            You are a Twitch chat moderation assistant. Parse the following voice command and extract moderation actions.
-            
-            Command: "{command_text}"
-            
-            Respond ONLY with a valid JSON object containing:
-            - action: one of [ban, unban, timeout, untimeout, clear, slow, slow_off, followers_only, followers_off, subscribers_only, subscribers_off, emote_only, emote_off, restrict, unrestrict, weather, unknown]
-            - username: target username (if applicable, null otherwise)
-            - duration: duration in seconds (if applicable, null otherwise)
-            - reason: reason for action (if mentioned, null otherwise)
-            - weather_location: location for weather commands (if applicable, null otherwise)
-            
-            Rules for parsing:
-            1. BANS are PERMANENT - never set duration for "ban" action, always null
-            2. For "timeout" without duration: use {Config.DEFAULT_TIMEOUT_DURATION} seconds
-            3. For "slow mode" without duration: use 10 seconds as default
-            4. For "followers_only" default duration is 1 second. Otherwise, use the duration provided.
-            5. Convert time units: minutes->seconds (*60), hours->seconds (*3600), days->seconds (*86400), weeks->seconds (*604800)
-            6. Clean usernames: lowercase, no spaces, alphanumeric + underscore only
-            7. Pay attention to opposite actions: "unban" vs "ban", "untimeout" vs "timeout", etc.
-            8. For unclear commands, use "unknown" action
-            9. Only these actions can have durations: timeout, slow, followers_only
-            10. Always convert weather country to abbreviation. Example: "United States" -> "US" or "United Kingdom" -> "UK" or "Italy" -> "IT"
-            
-            Command variations to recognize:
-            - "ban", "permanently ban", "band", "bend" -> ban (always permanent, duration = null)
-            - "timeout", "mute" -> timeout (with duration)
-            - "unban", "unben" -> remove ban
-            - "untimeout", "un tie mount", "remove timeout" -> remove timeout
-            - "clear chat", "clear the chat" -> clear
-            - "slow mode", "enable slow mode" -> slow
-            - "disable slow mode", "turn off slow mode", "slow off" -> slow_off
-            - "followers only", "follower mode" -> followers_only
-            - "disable followers only", "followers off", "remove followers only" -> followers_off
-            - "subscribers only", "sub mode", "subs only", "sub only" -> subscribers_only
-            - "disable subscribers only", "subs off", "sub off", "remove sub only", "remove subs only", "turn off sub only", "turn off subs only", "disable sub only", "disable sub mode" -> subscribers_off
-            - "emote only", "emotes only" -> emote_only
-            - "disable emote only", "emotes off", "remove emote only" -> emote_off
-            - "restrict user", "put user in restricted mode" -> restrict
-            - "unrestrict user", "remove restrictions" -> unrestrict
-            - "change weather to [location]", "set weather to [location]", "weather location [location]" -> weather
-            - "set the weather", "change the weather" (without location) -> unknown (incomplete command)
-            
-            Examples:
-            "ban johndoe" -> {{"action": "ban", "username": "johndoe", "duration": null, "reason": null}}
-            "permanently ban user123" -> {{"action": "ban", "username": "user123", "duration": null, "reason": null}}
-            "timeout user123 for 10 minutes" -> {{"action": "timeout", "username": "user123", "duration": 600, "reason": null}}
-            "unban johndoe" -> {{"action": "unban", "username": "johndoe", "duration": null, "reason": null}}
-            "untimeout user123" -> {{"action": "untimeout", "username": "user123", "duration": null, "reason": null}}
-            "clear the chat" -> {{"action": "clear", "username": null, "duration": null, "reason": null}}
-            "slow mode" -> {{"action": "slow", "username": null, "duration": 10, "reason": null}}
-            "slow mode 30 seconds" -> {{"action": "slow", "username": null, "duration": 30, "reason": null}}
-            "disable slow mode" -> {{"action": "slow_off", "username": null, "duration": null, "reason": null}}
-            "followers only 10 minutes" -> {{"action": "followers_only", "username": null, "duration": 600, "reason": null}}
-            "followers only mode" -> {{"action": "followers_only", "username": null, "duration": 1, "reason": null}}
-            "turn off followers only" -> {{"action": "followers_off", "username": null, "duration": null, "reason": null}}
-            "remove followers only" -> {{"action": "followers_off", "username": null, "duration": null, "reason": null}}
-            "subscribers only" -> {{"action": "subscribers_only", "username": null, "duration": null, "reason": null}}
-            "sub only" -> {{"action": "subscribers_only", "username": null, "duration": null, "reason": null}}
-            "subs only mode" -> {{"action": "subscribers_only", "username": null, "duration": null, "reason": null}}
-            "disable subs only" -> {{"action": "subscribers_off", "username": null, "duration": null, "reason": null}}
-            "remove sub only" -> {{"action": "subscribers_off", "username": null, "duration": null, "reason": null}}
-            "turn off sub only" -> {{"action": "subscribers_off", "username": null, "duration": null, "reason": null}}
-            "emote only mode" -> {{"action": "emote_only", "username": null, "duration": null, "reason": null}}
-            "turn off emote only" -> {{"action": "emote_off", "username": null, "duration": null, "reason": null, "weather_location": null}}
-            "restrict baduser" -> {{"action": "restrict", "username": "baduser", "duration": null, "reason": null, "weather_location": null}}
-            "unrestrict gooduser" -> {{"action": "unrestrict", "username": "gooduser", "duration": null, "reason": null, "weather_location": null}}
-            "change weather to Naples, Italy" -> {{"action": "weather", "username": null, "duration": null, "reason": null, "weather_location": "Naples, IT"}}
-            "set weather to Tokyo, Japan" -> {{"action": "weather", "username": null, "duration": null, "reason": null, "weather_location": "Tokyo, JP"}}
-            "set the weather" -> {{"action": "unknown", "username": null, "duration": null, "reason": null, "weather_location": null}}
-            "change the weather" -> {{"action": "unknown", "username": null, "duration": null, "reason": null, "weather_location": null}}
-            
-            Respond with ONLY the JSON object, no other text.
-            """
-            
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=200,
-                temperature=0.2
-            )
-            
-            result = response.choices[0].message.content.strip()
-            logger.debug(f"AI response: {result}")
-            
-            # Parse JSON response
-            try:
-                parsed = json.loads(result)
-                logger.debug(f"Parsed AI response: {parsed}")
-                
-                if parsed.get('action') != 'unknown':
-                    cmd = ModerationCommand(
-                        action=parsed.get('action'),
-                        username=parsed.get('username'),
-                        duration=parsed.get('duration'),
-                        reason=parsed.get('reason'),
-                        weather_location=parsed.get('weather_location')
-                    )
-                    
-                    # Post-process: Ensure slow mode always has a duration (default 10 seconds)
-                    if cmd.action == 'slow' and cmd.duration is None:
-                        cmd.duration = 10
-                        logger.debug(f"Applied default slow mode duration: 10 seconds")
-                    
-                    logger.debug(f"Created command object: {cmd}")
-                    return cmd
-                else:
-                    logger.info(f"Command not recognized as moderation action: {command_text}")
-                    return None
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse AI response as JSON: {result}")
-                return None
-            
+            parsed = await self._ai_parse_cached(command_text, on_username)
         except Exception as e:
             logger.error(f"AI command processing failed: {e}")
             return None
+        
+        if parsed is None:
+            logger.info(f"Command not recognized as moderation action: {command_text}")
+            return None
+        
+        return self._command_from_parsed(parsed)
+    
+    def _command_from_parsed(self, parsed: Tuple) -> ModerationCommand:
+        """Build a ModerationCommand from AI-parsed fields, applying defaults"""
+        action, username, duration, reason, weather_location = parsed
+        
+        # Post-process: Timeouts without a spoken duration use the configured default
+        if action == 'timeout' and duration is None:
+            duration = self._default_timeout
+        
+        # Post-process: Ensure slow mode always has a duration (default 10 seconds)
+        if action == 'slow' and duration is None:
+            duration = 10
+            logger.debug(f"Applied default slow mode duration: 10 seconds")
+        
+        cmd = ModerationCommand(
+            action=action,
+            username=username,
+            duration=duration,
+            reason=reason,
+            weather_location=weather_location
+        )
+        logger.debug(f"Created command object: {cmd}")
+        return cmd
+    
+    async def _ai_parse_cached(self, command_text: str,
+                               on_username: Optional[Callable[[str], None]] = None) -> Optional[Tuple]:
+        """_ai_parse_command behind an in-memory LRU and the on-disk cache, keyed on the normalized command"""
+        key = self._ai_cache_key(command_text)
+        found, parsed = await self._ai_cache_get(key)
+        if not found:
+            parsed = await self._ai_parse_command(command_text, on_username)
+            await self._ai_cache_put(key, parsed)
+        return parsed
+    
+    @staticmethod
+    def _ai_cache_key(command_text: str) -> str:
+        """Normalize a command into its AI parse cache key"""
+        # Transcripts of the same command differ in case, spacing and trailing punctuation
+        # ("Ban Bob." vs "ban  bob"); those share a cache entry. The model still sees the original.
+        return ' '.join(command_text.lower().split()).rstrip('.!?,')
+    
+    async def _ai_cache_get(self, key: str) -> Tuple[bool, Optional[Tuple]]:
+        """Look a cache key up in the in-memory LRU, then on disk; returns (found, parsed)"""
+        cache = self._ai_parse_cache
+        if key in cache:
+            cache.move_to_end(key)
+            return True, cache[key]
+        if self._disk_cache is not None:
+            parsed = await asyncio.to_thread(self._disk_cache_get, self._disk_cache_key(key))
+            if parsed is not None:
+                self._ai_cache_remember(key, parsed)
+                return True, parsed
+        return False, None
+    
+    async def _ai_cache_put(self, key: str, parsed: Optional[Tuple]):
+        """Store a fresh AI parse in the in-memory LRU and, if it was recognized, on disk"""
+        # Only recognized commands persist; an "unknown" parse may be a one-off bad answer
+        # and must not stick across restarts
+        if self._disk_cache is not None and parsed is not None:
+            await asyncio.to_thread(self._disk_cache_put, self._disk_cache_key(key), parsed)
+        self._ai_cache_remember(key, parsed)
+    
+    def _ai_cache_remember(self, key: str, parsed: Optional[Tuple]):
+        """Add a parse to the in-memory LRU, evicting the least recently used entry when full"""
+        cache = self._ai_parse_cache
+        cache[key] = parsed
+        if len(cache) > self._ai_parse_cache_size:
+            cache.popitem(last=False)
+    
+    async def _ai_parse_command(self, command_text: str,
+                                on_username: Optional[Callable[[str], None]] = None) -> Optional[Tuple]:
+        """
+        Ask OpenAI to parse a command into (action, username, duration, reason, weather_location)
+        
+        The response is streamed; on_username, if given, is called as soon as the username
+        field is complete so resolution can overlap with the remaining fields.
+        Returns None for commands the model reports as unknown. API errors are raised
+        rather than returned so _ai_parse_cached never caches a failure.
+        """
+        stream = await self.openai_client.chat.completions.create(
+            model=self._ai_model,
+            messages=[
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": command_text}
+            ],
+            tools=[_PARSE_COMMAND_TOOL],
+            tool_choice={"type": "function", "function": {"name": "parse_moderation_command"}},
+            max_tokens=self._ai_max_tokens,
+            temperature=0.2,
+            stream=True
+        )
+        
+        # The forced tool call carries the fields as a JSON object matching the schema,
+        # streamed as fragments of its arguments string
+        fragments = []
+        username_seen = on_username is None
+        tracker = _JsonObjectTracker()
+        try:
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.tool_calls:
+                    continue
+                fragment = chunk.choices[0].delta.tool_calls[0].function.arguments
+                if not fragment:
+                    continue
+                fragments.append(fragment)
+                if not username_seen:
+                    username_match = _PARTIAL_USERNAME_RE.search(''.join(fragments))
+                    if username_match:
+                        username_seen = True
+                        on_username(_json_loads(f'"{username_match.group(1)}"'))
+                if tracker.feed(fragment):
+                    # The object is closed; don't wait for the trailing finish chunks
+                    break
+        finally:
+            await stream.close()
+        result = ''.join(fragments)
+        logger.debug(f"AI response: {result}")
+        parsed = _json_loads(result)
+        logger.debug(f"Parsed AI response: {parsed}")
+        
+        return self._fields_from_parsed(parsed)
+    
+    async def _ai_parse_batch(self, command_texts: List[str]) -> List[Optional[Tuple]]:
+        """Parse several commands with one OpenAI request; same per-item result as _ai_parse_command"""
+        response = await self.openai_client.chat.completions.create(
+            model=self._ai_model,
+            messages=[
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "system", "content": self.BATCH_PROMPT},
+                {"role": "user", "content": json.dumps(command_texts)}
+            ],
+            tools=[_PARSE_COMMANDS_BATCH_TOOL],
+            tool_choice={"type": "function", "function": {"name": "parse_moderation_commands"}},
+            max_tokens=self._ai_max_tokens * len(command_texts),
+            temperature=0.2
+        )
+        
+        result = response.choices[0].message.tool_calls[0].function.arguments
+        logger.debug(f"AI batch response: {result}")
+        results = _json_loads(result)['results']
+        if len(results) != len(command_texts):
+            raise ValueError(f"Expected {len(command_texts)} results from AI, got {len(results)}")
+        return [self._fields_from_parsed(parsed) for parsed in results]
+    
+    @staticmethod
+    def _fields_from_parsed(parsed: Dict) -> Optional[Tuple]:
+        """Flatten a parsed AI result into a hashable tuple, or None for unknown commands"""
+        if parsed.get('action') == 'unknown':
+            return None
+        return (
+            parsed.get('action'),
+            parsed.get('username'),
+            parsed.get('duration'),
+            parsed.get('reason'),
+            parsed.get('weather_location')
+        )
     
     def validate_command(self, cmd: ModerationCommand) -> Tuple[bool, str]:
         """
@@ -288,35 +916,23 @@ class CommandProcessor:
         if not cmd.action:
             return False, "No action specified"
         
-        # Commands that require a username
-        user_required_actions = ['ban', 'unban', 'timeout', 'untimeout', 'restrict', 'unrestrict']
-        
-        # Commands that pose danger if username is not verified (can affect innocent users)
-        dangerous_actions = ['ban', 'timeout', 'restrict']
-        
-        # Commands that require a weather location
-        weather_required_actions = ['weather']
-        
-        # Commands that can have durations
-        duration_allowed_actions = ['timeout', 'slow', 'followers_only']
-        
         # Validate username for user-specific actions
-        if cmd.action in user_required_actions and not cmd.username:
+        if cmd.action in USER_REQUIRED_ACTIONS and not cmd.username:
             return False, f"Username required for {cmd.action} action"
         
         # SAFETY CHECK: For dangerous actions, username must be resolved from recent chat
-        if cmd.action in dangerous_actions and cmd.username:
+        if cmd.action in DANGEROUS_ACTIONS and cmd.username:
             if not cmd.username_resolved:
                 original = cmd.original_username or cmd.username
                 return False, f"Cannot {cmd.action} user '{original}' - username not found in recent chat. Only users who have recently chatted can be moderated for safety."
         
         # Validate weather location for weather actions
-        if cmd.action in weather_required_actions and not cmd.weather_location:
+        if cmd.action in WEATHER_REQUIRED_ACTIONS and not cmd.weather_location:
             return False, f"Weather location required for {cmd.action} action"
         
         # Validate username format
         if cmd.username:
-            if not re.match(r'^[a-zA-Z0-9_]{1,25}$', cmd.username):
+            if not (len(cmd.username) <= 25 and not cmd.username.translate(_USERNAME_CHARS_TABLE)):
                 return False, f"Invalid username format: {cmd.username}"
         
         # Validate that bans never have durations (they are permanent)
@@ -324,7 +940,7 @@ class CommandProcessor:
             return False, "Bans are permanent and cannot have durations"
         
         # Validate that only certain actions can have durations
-        if cmd.duration is not None and cmd.action not in duration_allowed_actions:
+        if cmd.duration is not None and cmd.action not in DURATION_ALLOWED_ACTIONS:
             return False, f"Duration not allowed for {cmd.action} action"
         
         # Validate duration limits
@@ -339,17 +955,13 @@ class CommandProcessor:
                     return False, "Duration must be at least 1 second"
             
             # Check maximum duration limits based on Twitch's official limits
-            if cmd.action == 'timeout' and cmd.duration > Config.MAX_TIMEOUT_DURATION:
-                return False, f"Timeout duration cannot exceed {Config.MAX_TIMEOUT_DURATION} seconds (14 days)"
-            elif cmd.action == 'followers_only' and cmd.duration > Config.MAX_FOLLOWERS_ONLY_DURATION:
-                return False, f"Followers-only duration cannot exceed {Config.MAX_FOLLOWERS_ONLY_DURATION} seconds (3 months)"
+            if cmd.action == 'timeout' and cmd.duration > self._max_timeout:
+                return False, f"Timeout duration cannot exceed {self._max_timeout} seconds (14 days)"
+            elif cmd.action == 'followers_only' and cmd.duration > self._max_followers_only:
+                return False, f"Followers-only duration cannot exceed {self._max_followers_only} seconds (3 months)"
         
         return True, ""
     
     def get_supported_commands(self) -> List[str]:
         """Get list of supported command types"""
-        return [
-            'ban', 'unban', 'timeout', 'untimeout', 'clear', 'slow', 'slow_off',
-            'followers_only', 'followers_off', 'subscribers_only', 'subscribers_off',
-            'emote_only', 'emote_off', 'restrict', 'unrestrict', 'weather'
-        ] 
\ No newline at end of file
+        return list(SUPPORTED_ACTIONS) 
\ No newline at end of file
@@ -2,8 +2,36 @@ import os
 import re
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Load environment variables (existing process environment takes precedence over .env)
+load_dotenv(override=False)
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting, falling back to the default when unset or empty"""
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting, falling back to the default when unset or empty"""
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a 'true'/'false' setting, falling back to the default when unset or empty"""
+    value = os.environ.get(name)
+    return value.lower() == 'true' if value else default
+
+
+def _compile_activation_re(keyword: str) -> re.Pattern:
+    """Build the activation matcher: the keyword's words separated by optional commas/spaces,
+    plus any punctuation/spaces after it so the match ends where the command starts"""
+    return re.compile(
+        r'\b' + r'[,\s]*'.join(re.escape(word) for word in keyword.split()) + r'\b[!\.\?,\s]*',
+        re.IGNORECASE
+    )
+
 
 class Config:
     # Twitch Configuration
@@ -26,42 +54,60 @@ class Config:
     
     # OpenAI Configuration
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    AI_PARSE_CACHE_PATH = os.getenv('AI_PARSE_CACHE_PATH', 'ai_parse_cache.sqlite3')  # SQLite file for cached AI parses; empty disables
+    LOCAL_INTENT_MODEL = os.getenv('LOCAL_INTENT_MODEL', '')  # e.g. 'all-MiniLM-L6-v2' to answer simple commands locally; empty disables
+    LOCAL_INTENT_THRESHOLD = _env_float('LOCAL_INTENT_THRESHOLD', 0.75)  # Minimum cosine similarity to trust the local classifier
     
     # Hugging Face Configuration (for Inference Endpoints)
     HF_API_TOKEN = os.getenv('HF_API_TOKEN')
     HF_ENDPOINT_URL = os.getenv('HF_ENDPOINT_URL')
+    HF_UPLOAD_CODEC = os.getenv('HF_UPLOAD_CODEC', 'wav').lower()  # 'wav' or 'flac' (requires soundfile)
+    
+    # Speech-to-text backend: 'hf' (Inference Endpoint) or 'faster_whisper' (local CTranslate2 model)
+    WHISPER_BACKEND = os.getenv('WHISPER_BACKEND', 'hf').lower()
+    WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'large-v3')
+    WHISPER_DEVICE = os.getenv('WHISPER_DEVICE', 'auto')  # 'auto', 'cuda' or 'cpu'
+    WHISPER_COMPUTE_TYPE = os.getenv('WHISPER_COMPUTE_TYPE', '')  # Empty picks int8_float16 on GPU, int8 on CPU
+    WHISPER_BEAM_SIZE = _env_int('WHISPER_BEAM_SIZE', 1)
     
     # Voice Recognition Settings
     VOICE_ACTIVATION_KEYWORD = os.getenv('VOICE_ACTIVATION_KEYWORD', 'hey brian').lower()
-    VOICE_TIMEOUT = int(os.getenv('VOICE_TIMEOUT', 5))
-    VOICE_PHRASE_TIMEOUT = int(os.getenv('VOICE_PHRASE_TIMEOUT', 2))
-    VOICE_COMMAND_TIMEOUT = float(os.getenv('VOICE_COMMAND_TIMEOUT', 15.0))  # Seconds to wait for sentence continuation
+    VOICE_TIMEOUT = _env_int('VOICE_TIMEOUT', 5)
+    VOICE_PHRASE_TIMEOUT = _env_int('VOICE_PHRASE_TIMEOUT', 2)
+    VOICE_COMMAND_TIMEOUT = _env_float('VOICE_COMMAND_TIMEOUT', 15.0)  # Seconds to wait for sentence continuation
     
     # Transcription Logging
-    ENABLE_TRANSCRIPTION_LOGGING = os.getenv('ENABLE_TRANSCRIPTION_LOGGING', 'true').lower() == 'true'
+    ENABLE_TRANSCRIPTION_LOGGING = _env_bool('ENABLE_TRANSCRIPTION_LOGGING', True)
     
     # Voice Activity Detection Settings
-    VOICE_SILENCE_THRESHOLD = int(os.getenv('VOICE_SILENCE_THRESHOLD', 1500))
-    VOICE_MIN_SPEECH_CHUNKS = int(os.getenv('VOICE_MIN_SPEECH_CHUNKS', 8))
-    VOICE_NO_SPEECH_THRESHOLD = float(os.getenv('VOICE_NO_SPEECH_THRESHOLD', 0.6))
-    VOICE_MIN_SPEECH_VOLUME = int(os.getenv('VOICE_MIN_SPEECH_VOLUME', 100))  # Minimum RMS for speech detection
+    VOICE_SILENCE_THRESHOLD = _env_int('VOICE_SILENCE_THRESHOLD', 1500)
+    VOICE_MIN_SPEECH_CHUNKS = _env_int('VOICE_MIN_SPEECH_CHUNKS', 8)
+    VOICE_NO_SPEECH_THRESHOLD = _env_float('VOICE_NO_SPEECH_THRESHOLD', 0.6)
+    VOICE_MIN_SPEECH_VOLUME = _env_int('VOICE_MIN_SPEECH_VOLUME', 100)  # Minimum RMS for speech detection
+    VOICE_VAD_MODE = _env_int('VOICE_VAD_MODE', 2)  # webrtcvad aggressiveness 0-3 (used when webrtcvad is installed)
+    VOICE_VAD_MIN_SPEECH_RATIO = _env_float('VOICE_VAD_MIN_SPEECH_RATIO', 0.1)  # Minimum share of 30 ms frames with speech
     
     # Moderation Settings
-    DEFAULT_TIMEOUT_DURATION = int(os.getenv('DEFAULT_TIMEOUT_DURATION', 600))  # 10 minutes default for timeouts
-    MAX_TIMEOUT_DURATION = int(os.getenv('MAX_TIMEOUT_DURATION', 1209600))  # 14 days max for timeouts (Twitch limit)
-    MAX_FOLLOWERS_ONLY_DURATION = int(os.getenv('MAX_FOLLOWERS_ONLY_DURATION', 7776000))  # 3 months max for followers-only mode
-    ENABLE_AUTO_MODERATION = os.getenv('ENABLE_AUTO_MODERATION', 'true').lower() == 'true'
+    DEFAULT_TIMEOUT_DURATION = _env_int('DEFAULT_TIMEOUT_DURATION', 600)  # 10 minutes default for timeouts
+    MAX_TIMEOUT_DURATION = _env_int('MAX_TIMEOUT_DURATION', 1209600)  # 14 days max for timeouts (Twitch limit)
+    MAX_FOLLOWERS_ONLY_DURATION = _env_int('MAX_FOLLOWERS_ONLY_DURATION', 7776000)  # 3 months max for followers-only mode
+    ENABLE_AUTO_MODERATION = _env_bool('ENABLE_AUTO_MODERATION', True)
     
     # Rate Limiting (per Twitch guidelines)
     MESSAGE_RATE_LIMIT = 20  # messages per 30 seconds for regular bots
     JOIN_RATE_LIMIT = 20     # joins per 10 seconds
     
+    # Activation keyword matcher, compiled once: the keyword's words separated by optional
+    # commas/spaces, e.g. "hey brian", "hey, brian", "hey, brian.", "hey brian!"
+    _ACTIVATION_RE = _compile_activation_re(VOICE_ACTIVATION_KEYWORD)
+    # First keyword word, used as a plain substring prefilter: most transcripts are regular
+    # speech without the keyword, and `in` rejects them far faster than the regex scan
+    _ACTIVATION_PREFIX = ''.join(VOICE_ACTIVATION_KEYWORD.split()[:1])
+    
     @classmethod
     def set_twitch_channel(cls, channel: str):
         """Set the Twitch channel dynamically"""
-        cls.TWITCH_CHANNEL = channel.lower().strip()
-        if cls.TWITCH_CHANNEL.startswith('#'):
-            cls.TWITCH_CHANNEL = cls.TWITCH_CHANNEL[1:]  # Remove # if present
+        cls.TWITCH_CHANNEL = channel.strip().lstrip('#').lower()  # Remove # if present
     
     @classmethod
     def set_kick_channel(cls, channel: str):
@@ -110,13 +156,15 @@ class Config:
         Find activation keyword in text with flexible matching for punctuation variations.
         
         Returns:
-            (found, start_index, end_index) - end_index is exclusive
+            (found, start_index, end_index) - end_index is exclusive and already past any
+            punctuation/spaces following the keyword
         """
-        # Create regex pattern that matches "hey" followed by optional punctuation/spaces, then "brian"
-        # This will match: "hey brian", "hey, brian", "hey, brian.", "hey brian!", etc.
-        pattern = r'\b' + re.escape("hey") + r'[,\s]*' + re.escape("brian") + r'[!\.\?]*\b'
+        # Voice transcripts arrive lowercased already, so only other input needs a lowered copy
+        lowered = text if text.islower() else text.lower()
+        if cls._ACTIVATION_PREFIX not in lowered:
+            return False, -1, -1
         
-        match = re.search(pattern, text.lower())
+        match = cls._ACTIVATION_RE.search(text)
         if match:
             return True, match.start(), match.end()
         
@@ -127,9 +175,6 @@ class Config:
         """Extract command text after the activation keyword, handling punctuation variations."""
         found, start_idx, end_idx = cls.find_activation_keyword(text)
         if found:
-            # Extract everything after the activation keyword match
-            command_part = text[end_idx:].strip()
-            # Remove leading punctuation/connectors like "." "," etc.
-            command_part = re.sub(r'^[,\.\!\?\s]+', '', command_part)
-            return command_part
+            # Extract everything after the activation keyword match (leading "." "," etc. are part of it)
+            return text[end_idx:].rstrip()
         return text 
\ No newline at end of file
@@ -1,15 +1,16 @@
+import time
 import asyncio
 import logging
-from typing import Dict, List, Optional, Set
+import threading
+import aiohttp
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
 from enum import Enum
+from dataclasses import replace
 from datetime import datetime
 
 from .config import Config
-from .command_processor import ModerationCommand, CommandSessionLogger
-from ..platforms.twitch.twitch_bot import TwitchModeratorBot
-from ..platforms.kick.kick_bot import KickModeratorBot
-from ..platforms.kick.kick_username_logger import KickUsernameLogger, KickAIModerationHelper
-from ..platforms.twitch.twitch_username_logger import TwitchUsernameLogger, TwitchAIModerationHelper
+from .command_processor import ModerationCommand, CommandSessionLogger, USER_REQUIRED_ACTIONS
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,26 @@ class Platform(Enum):
     TWITCH = "twitch"
     KICK = "kick"
 
+# Platform lookup by its lowercase config/API name
+_NAME_TO_PLATFORM: Dict[str, Platform] = {p.value: p for p in Platform}
+_SUPPORTED_PLATFORM_NAMES: Tuple[str, ...] = tuple(_NAME_TO_PLATFORM)
+
+
+async def _stop_twitch_logger(logger_instance):
+    # Twitch logger only needs its is_running flag cleared
+    logger_instance.stop_monitoring()
+
+
+async def _stop_kick_logger(logger_instance):
+    # Kick logger has async stop_monitoring that closes its WebSocket
+    await logger_instance.stop_monitoring()
+
+
+_LOGGER_STOPPERS = {
+    Platform.TWITCH: _stop_twitch_logger,
+    Platform.KICK: _stop_kick_logger,
+}
+
 class MultiPlatformManager:
     """
     Manages multiple streaming platforms (Twitch, Kick) for the AI Moderator Bot
@@ -32,13 +53,24 @@ class MultiPlatformManager:
         """
         self.command_callback = command_callback
         self.enabled_platforms: Set[Platform] = set()
+        # Ordered snapshot of enabled_platforms for iteration (Twitch first, as in get_primary_ai_helper)
+        self._enabled_tuple: Tuple[Platform, ...] = ()
         self.bots: Dict[Platform, object] = {}
         self.username_loggers: Dict[Platform, object] = {}
         self.ai_helpers: Dict[Platform, object] = {}
         self.is_running = False
         
-        # Cross-platform username resolution
-        self.unified_usernames = set()
+        # Cross-platform username resolution: recently seen usernames, oldest first
+        self.unified_usernames: "OrderedDict[str, None]" = OrderedDict()
+        self._unified_usernames_size = 100
+        # Recent successful resolutions: lowercased spoken name -> (monotonic time, {platform: username}).
+        # Resolution runs in worker threads, hence the lock
+        self._resolve_cache: "OrderedDict[str, Tuple[float, Dict[Platform, str]]]" = OrderedDict()
+        self._resolve_cache_size = 512
+        self._resolve_cache_ttl = 5.0
+        self._resolve_cache_lock = threading.Lock()
+        # One keep-alive connection pool (and DNS cache) shared by every platform API client
+        self._http_session: Optional[aiohttp.ClientSession] = None
         
     async def initialize(self, platforms: List[str]):
         """
@@ -51,23 +83,27 @@ class MultiPlatformManager:
         successfully_initialized = []
         failed_platforms = []
         
+        pending = []  # (requested name, platform, initializer coroutine)
         for platform_name in platforms:
-            try:
-                platform = Platform(platform_name.lower())
-                
-                if platform == Platform.TWITCH:
-                    await self._initialize_twitch()
-                    self.enabled_platforms.add(platform)
-                    successfully_initialized.append(platform.value)
-                elif platform == Platform.KICK:
-                    await self._initialize_kick()
-                    self.enabled_platforms.add(platform)
-                    successfully_initialized.append(platform.value)
-                    
-            except Exception as e:
-                logger.error(f"Failed to initialize {platform_name}: {e}")
+            platform = _NAME_TO_PLATFORM.get(platform_name.lower())
+            if platform is None:
+                logger.error(f"Failed to initialize {platform_name}: Unknown platform")
                 failed_platforms.append(platform_name)
                 continue
+            initializer = self._initialize_twitch if platform == Platform.TWITCH else self._initialize_kick
+            pending.append((platform_name, platform, initializer()))
+        
+        # Each platform authenticates against its own API, so bring them up concurrently
+        outcomes = await asyncio.gather(*(coro for _, _, coro in pending), return_exceptions=True)
+        for (platform_name, platform, _), outcome in zip(pending, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Failed to initialize {platform_name}: {outcome}")
+                failed_platforms.append(platform_name)
+            else:
+                self.enabled_platforms.add(platform)
+                successfully_initialized.append(platform.value)
+        
+        self._refresh_enabled()
         
         if successfully_initialized:
             logger.info(f"✅ Multi-platform manager initialized for: {successfully_initialized}")
@@ -76,16 +112,39 @@ class MultiPlatformManager:
             return True
         else:
             logger.error("❌ Failed to initialize any platforms")
+            # No bot will use the shared connection pool; don't leak it
+            await self._close_http_session()
             return False
     
+    def _refresh_enabled(self):
+        """Rebuild the ordered enabled-platform snapshot after enabled_platforms changes"""
+        self._enabled_tuple = tuple(p for p in (Platform.TWITCH, Platform.KICK) if p in self.enabled_platforms)
+    
+    def _get_http_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, creating it on first use"""
+        if self._http_session is None or self._http_session.closed:
+            connector = aiohttp.TCPConnector(limit=50, limit_per_host=20, keepalive_timeout=60, ttl_dns_cache=300)
+            self._http_session = aiohttp.ClientSession(connector=connector)
+        return self._http_session
+    
+    async def _close_http_session(self):
+        """Close the shared HTTP session, if one was created"""
+        if self._http_session is not None:
+            await self._http_session.close()
+            self._http_session = None
+    
     async def _initialize_twitch(self):
         """Initialize Twitch platform"""
         # Validate Twitch configuration
         if not all([Config.TWITCH_TOKEN, Config.TWITCH_CLIENT_ID, Config.TWITCH_CHANNEL]):
             raise ValueError("Missing Twitch configuration")
         
+        # Platform modules are imported on demand so a single-platform setup never loads the other's stack
+        from ..platforms.twitch.twitch_bot import TwitchModeratorBot
+        from ..platforms.twitch.twitch_username_logger import TwitchUsernameLogger, TwitchAIModerationHelper
+        
         # Initialize Twitch bot
-        twitch_bot = TwitchModeratorBot(command_callback=self._on_command_executed)
+        twitch_bot = TwitchModeratorBot(command_callback=self._bot_command_callback(), session=self._get_http_session())
         success = await twitch_bot.initialize()
         
         if success:
@@ -109,8 +168,11 @@ class MultiPlatformManager:
         if not all([Config.KICK_CLIENT_ID, Config.KICK_CLIENT_SECRET, Config.KICK_CHANNEL]):
             raise ValueError("Missing Kick configuration")
         
+        from ..platforms.kick.kick_bot import KickModeratorBot
+        from ..platforms.kick.kick_username_logger import KickUsernameLogger, KickAIModerationHelper
+        
         # Initialize Kick bot
-        kick_bot = KickModeratorBot(command_callback=self._on_command_executed)
+        kick_bot = KickModeratorBot(command_callback=self._bot_command_callback(), session=self._get_http_session())
         success = await kick_bot.initialize()
         
         if success:
@@ -151,7 +213,7 @@ class MultiPlatformManager:
             # Send status messages to all platforms
             await self._send_status_messages()
             
-            logger.info(f"✅ Multi-platform bot started on: {[p.value for p in self.enabled_platforms]}")
+            logger.info("✅ Multi-platform bot started on: %s", [p.value for p in self._enabled_tuple])
             
             # Wait for all monitoring tasks
             if tasks:
@@ -166,32 +228,39 @@ class MultiPlatformManager:
         try:
             self.is_running = False
             
-            # Stop all bots
-            for platform, bot in self.bots.items():
-                try:
-                    await bot.close()
-                    logger.info(f"Stopped {platform.value} bot")
-                except Exception as e:
-                    logger.error(f"Error stopping {platform.value} bot: {e}")
+            # Stop all bots (connections close independently, so in parallel)
+            await asyncio.gather(*(self._close_bot(platform, bot) for platform, bot in self.bots.items()))
             
             # Stop username loggers
-            for platform, logger_instance in self.username_loggers.items():
-                try:
-                    if platform == Platform.KICK and hasattr(logger_instance, 'stop_monitoring'):
-                        # Kick logger has async stop_monitoring
-                        await logger_instance.stop_monitoring()
-                    elif hasattr(logger_instance, 'is_running'):
-                        # Twitch logger just needs is_running set to False
-                        logger_instance.is_running = False
-                    logger.info(f"Stopped {platform.value} username logger")
-                except Exception as e:
-                    logger.error(f"Error stopping {platform.value} logger: {e}")
+            await asyncio.gather(*(
+                self._stop_username_logger(platform, logger_instance)
+                for platform, logger_instance in self.username_loggers.items()
+            ))
+            
+            # Bots and loggers are done with the shared connection pool
+            await self._close_http_session()
             
             logger.info("✅ Multi-platform manager stopped")
             
         except Exception as e:
             logger.error(f"Error stopping multi-platform manager: {e}")
     
+    async def _close_bot(self, platform: Platform, bot):
+        """Close one platform bot, logging instead of raising"""
+        try:
+            await bot.close()
+            logger.info(f"Stopped {platform.value} bot")
+        except Exception as e:
+            logger.error(f"Error stopping {platform.value} bot: {e}")
+    
+    async def _stop_username_logger(self, platform: Platform, logger_instance):
+        """Stop one platform's username logger, logging instead of raising"""
+        try:
+            await _LOGGER_STOPPERS[platform](logger_instance)
+            logger.info(f"Stopped {platform.value} username logger")
+        except Exception as e:
+            logger.error(f"Error stopping {platform.value} logger: {e}")
+    
     async def execute_command_on_platform(self, cmd: ModerationCommand, platform: Platform) -> bool:
         """Execute a moderation command on a specific platform"""
         logger.info(f"🎯 Executing command '{cmd.action}' on platform: {platform.value}")
@@ -221,130 +290,198 @@ class MultiPlatformManager:
             return False
     
     async def execute_command_on_all_platforms(self, cmd: ModerationCommand) -> Dict[Platform, bool]:
-        """Execute a moderation command on all enabled platforms"""
-        results = {}
+        """Execute a moderation command on all enabled platforms concurrently"""
+        platforms = self._enabled_tuple
+        if len(platforms) == 1:
+            # Single platform: await directly, no gather bookkeeping
+            platform = platforms[0]
+            return {platform: await self.execute_command_on_platform(cmd, platform)}
         
-        for platform in self.enabled_platforms:
-            results[platform] = await self.execute_command_on_platform(cmd, platform)
+        outcomes = await asyncio.gather(
+            *(self.execute_command_on_platform(cmd, platform) for platform in platforms),
+            return_exceptions=True
+        )
         
+        results = {}
+        for platform, outcome in zip(platforms, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Error executing command on {platform.value}: {outcome}")
+                outcome = False
+            results[platform] = outcome
         return results
     
     async def execute_command_on_enabled_platforms(self, cmd: ModerationCommand) -> Dict[Platform, bool]:
         """Execute command based on enabled platforms"""
-        logger.info(f"🚀 Multi-platform manager executing command '{cmd.action}' on enabled platforms: {[p.value for p in self.enabled_platforms]}")
+        # Platform-name lists are only built when INFO records will actually be emitted
+        log_info = logger.isEnabledFor(logging.INFO)
+        if log_info:
+            logger.info("🚀 Multi-platform manager executing command '%s' on enabled platforms: %s",
+                        cmd.action, [p.value for p in self._enabled_tuple])
         
-        user_required_actions = ['ban', 'unban', 'timeout', 'untimeout', 'restrict', 'unrestrict']
-        if cmd.action in user_required_actions and hasattr(self, 'last_username_resolution_map') and self.last_username_resolution_map:
-            logger.info(f"📡 Executing on platforms where username was found: {[p.value for p in self.last_username_resolution_map.keys()]}")
-            results = {}
-            for platform, resolved_username in self.last_username_resolution_map.items():
-                # Use a copy of the command with the correct username for this platform
-                platform_cmd = ModerationCommand(
-                    action=cmd.action,
-                    username=resolved_username,
-                    duration=cmd.duration,
-                    reason=cmd.reason,
-                    additional_params=cmd.additional_params,
-                    original_username=cmd.original_username,
-                    weather_location=cmd.weather_location,
-                    username_resolved=True
-                )
-                results[platform] = await self.execute_command_on_platform(platform_cmd, platform)
-            return results
+        # The per-platform names travel with the command, so commands resolved back to back
+        # (e.g. the parts of "ban alice, timeout bob") each keep their own target
+        if cmd.action in USER_REQUIRED_ACTIONS and cmd.platform_usernames:
+            if log_info:
+                logger.info("📡 Executing on platforms where username was found: %s",
+                            [p.value for p in cmd.platform_usernames])
+            resolution_map = cmd.platform_usernames
+            platforms = list(resolution_map)
+            if len(platforms) == 1:
+                platform = platforms[0]
+                platform_cmd = replace(cmd, username=resolution_map[platform], username_resolved=True)
+                return {platform: await self.execute_command_on_platform(platform_cmd, platform)}
+            # Use a copy of the command with the correct username for each platform; the platform
+            # API calls are independent, so run them concurrently
+            outcomes = await asyncio.gather(*(
+                self.execute_command_on_platform(replace(cmd, username=resolution_map[platform], username_resolved=True), platform)
+                for platform in platforms
+            ))
+            return dict(zip(platforms, outcomes))
         elif self.enabled_platforms:
-            logger.info(f"📡 Executing on ALL enabled platforms: {[p.value for p in self.enabled_platforms]}")
+            if log_info:
+                logger.info("📡 Executing on ALL enabled platforms: %s", [p.value for p in self._enabled_tuple])
             return await self.execute_command_on_all_platforms(cmd)
         else:
             logger.warning("No platforms are enabled")
             return {}
     
-    def resolve_username_across_platforms(self, partial_username: str) -> Optional[str]:
+    def resolve_username_map(self, partial_username: str) -> Dict[Platform, str]:
         """
-        Try to resolve username across all enabled platforms.
-        Returns the first successful match found (for legacy compatibility),
-        but also stores a mapping of all platforms where a match was found.
+        Resolve a spoken username on every enabled platform.
+        Returns {platform: resolved_username} for each platform with a match (empty if none).
+        Nothing is stored on the manager, so resolutions running in parallel stay independent;
+        callers keep the mapping with the command it belongs to.
         """
-        logger.info(f"🔍 Resolving username '{partial_username}' across platforms: {[p.value for p in self.enabled_platforms]}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("🔍 Resolving username '%s' across platforms: %s", partial_username, [p.value for p in self._enabled_tuple])
+        
+        # The same spoken name usually repeats within seconds (retries, split commands); reuse a
+        # fresh match instead of re-running fuzzy/phonetic/AI matching on every platform
+        key = partial_username.lower()
+        with self._resolve_cache_lock:
+            cached = self._resolve_cache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self._resolve_cache_ttl:
+                self._resolve_cache.move_to_end(key)
+            else:
+                cached = None
         
-        self.last_username_resolution = None
-        self.last_username_resolution_platforms = set()
-        self.last_username_resolution_map = {}  # {platform: resolved_username}
-        first_match = None
-        for platform in self.enabled_platforms:
+        if cached is not None:
+            matches = dict(cached[1])
+            logger.info("✅ Username '%s' resolved to '%s' (recent match)", partial_username, next(iter(matches.values())))
+            return matches
+        
+        matches: Dict[Platform, str] = {}
+        # Every platform is queried on purpose: execute_command_on_enabled_platforms needs the
+        # per-platform names, so stopping at the first hit would skip the ban on the other platform
+        for platform in self._enabled_tuple:
             ai_helper = self.ai_helpers.get(platform)
             if ai_helper:
                 try:
                     resolved = ai_helper.resolve_username(partial_username)
                     if resolved:
-                        logger.info(f"✅ Username '{partial_username}' resolved to '{resolved}' via {platform.value}")
-                        self.last_username_resolution_map[platform] = resolved
-                        if not first_match:
-                            first_match = resolved
+                        logger.info("✅ Username '%s' resolved to '%s' via %s", partial_username, resolved, platform.value)
+                        matches[platform] = resolved
                 except Exception as e:
                     logger.error(f"Error resolving username on {platform.value}: {e}")
-        if self.last_username_resolution_map:
-            self.last_username_resolution = first_match
-            self.last_username_resolution_platforms = set(self.last_username_resolution_map.keys())
-            return first_match
+        
+        if matches:
+            # Only matches are cached, so a user who just started chatting is found on the next try
+            with self._resolve_cache_lock:
+                self._resolve_cache[key] = (time.monotonic(), dict(matches))
+                self._resolve_cache.move_to_end(key)
+                if len(self._resolve_cache) > self._resolve_cache_size:
+                    self._resolve_cache.popitem(last=False)
         else:
             logger.warning(f"❌ No username match found across any platform for: '{partial_username}'")
-            self.last_username_resolution = None
-            self.last_username_resolution_platforms = set()
-            self.last_username_resolution_map = {}
-            return None
+        return matches
+    
+    def resolve_username_across_platforms(self, partial_username: str) -> Optional[str]:
+        """
+        Try to resolve username across all enabled platforms.
+        Returns the first successful match found (for legacy compatibility); use
+        resolve_username_map for the match on each platform.
+        """
+        return next(iter(self.resolve_username_map(partial_username).values()), None)
+    
+    def resolve_usernames_batch(self, partial_usernames: List[str]) -> Dict[str, Dict[Platform, str]]:
+        """
+        Resolve the spoken usernames of a command burst in one call.
+        A name spoken twice ("timeout bob, then ban bob") is matched once; each name maps to
+        its resolve_username_map result.
+        """
+        results: Dict[str, Dict[Platform, str]] = {}
+        for partial_username in partial_usernames:
+            if partial_username not in results:
+                results[partial_username] = self.resolve_username_map(partial_username)
+        return results
     
     def resolve_username(self, partial_username: str) -> Optional[str]:
         """Fallback method for single platform resolution (for compatibility)"""
         return self.resolve_username_across_platforms(partial_username)
     
-    async def _on_command_executed(self, cmd: ModerationCommand, success: bool):
+    def _bot_command_callback(self):
+        """Callback to hand to platform bots; None lets them skip the call entirely"""
+        return self._on_command_executed if self.command_callback else None
+    
+    def _on_command_executed(self, cmd: ModerationCommand, success: bool):
         """Callback when a command is executed on any platform"""
-        if self.command_callback:
-            try:
-                await self.command_callback(cmd, success)
-            except Exception as e:
-                logger.error(f"Error in command callback: {e}")
+        # Bots invoke this synchronously, so the registered callback is a plain function too
+        try:
+            self.command_callback(cmd, success)
+        except Exception as e:
+            logger.error(f"Error in command callback: {e}")
     
     async def _on_kick_username(self, username: str, platform: str):
         """Callback when a username is detected in Kick chat"""
         try:
-            # Add to unified username set for cross-platform resolution
-            self.unified_usernames.add(username.lower())
+            # Add to unified usernames for cross-platform resolution, as the most recent entry
+            username = username.lower()
+            self.unified_usernames[username] = None
+            self.unified_usernames.move_to_end(username)
             
             # Keep only recent usernames (last 100)
-            if len(self.unified_usernames) > 100:
-                # Convert to list, keep last 100, convert back to set
-                username_list = list(self.unified_usernames)
-                self.unified_usernames = set(username_list[-100:])
+            if len(self.unified_usernames) > self._unified_usernames_size:
+                self.unified_usernames.popitem(last=False)
                 
         except Exception as e:
             logger.error(f"Error processing Kick username: {e}")
     
     async def _send_status_messages(self):
-        """Send status messages to all platforms"""
-        for platform, bot in self.bots.items():
+        """Send status messages to all platforms concurrently"""
+        platforms = list(self.bots)
+        if len(platforms) == 1:
+            platform = platforms[0]
             try:
-                await bot.send_status_message()
+                await self.bots[platform].send_status_message()
             except Exception as e:
                 logger.error(f"Failed to send status message to {platform.value}: {e}")
+            return
+        
+        outcomes = await asyncio.gather(
+            *(self.bots[platform].send_status_message() for platform in platforms),
+            return_exceptions=True
+        )
+        for platform, outcome in zip(platforms, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Failed to send status message to {platform.value}: {outcome}")
     
     def get_platform_status(self) -> Dict[str, Dict]:
         """Get status of all platforms"""
         status = {}
         
-        for platform in self.enabled_platforms:
+        for platform in self._enabled_tuple:
             bot = self.bots.get(platform)
             status[platform.value] = {
                 'enabled': True,
-                'connected': getattr(bot, 'is_connected', False) if bot else False,
+                'connected': bot.is_connected if bot else False,
                 'bot_available': bot is not None
             }
         
         return status
     
-    def get_supported_platforms(self) -> List[str]:
-        """Get list of supported platform names"""
-        return [platform.value for platform in Platform]
+    def get_supported_platforms(self) -> Tuple[str, ...]:
+        """Get supported platform names"""
+        return _SUPPORTED_PLATFORM_NAMES
     
     def get_ai_helper_for_platform(self, platform: Platform) -> Optional[object]:
         """Get the AI helper for a specific platform"""
@@ -363,36 +500,28 @@ class MultiPlatformManager:
     
     async def stop_platform(self, platform: str):
         """Stop a single platform (twitch or kick)"""
-        plat_enum = Platform.TWITCH if platform == "twitch" else Platform.KICK
+        plat_enum = _NAME_TO_PLATFORM[platform]
         
         # Stop the bot
-        bot = self.bots.get(plat_enum)
+        bot = self.bots.pop(plat_enum, None)
         if bot:
-            await bot.close()
-            del self.bots[plat_enum]
-            logger.info(f"Stopped {platform} bot")
+            await self._close_bot(plat_enum, bot)
         
         # Stop the username logger
-        logger_instance = self.username_loggers.get(plat_enum)
+        logger_instance = self.username_loggers.pop(plat_enum, None)
         if logger_instance:
-            try:
-                if hasattr(logger_instance, 'stop_monitoring'):
-                    # Kick logger has async stop_monitoring
-                    await logger_instance.stop_monitoring()
-                elif hasattr(logger_instance, 'is_running'):
-                    # Twitch logger just needs is_running set to False
-                    logger_instance.is_running = False
-                logger.info(f"Stopped {platform} username logger")
-            except Exception as e:
-                logger.error(f"Error stopping {platform} logger: {e}")
-            del self.username_loggers[plat_enum]
+            await self._stop_username_logger(plat_enum, logger_instance)
         
         # Remove from enabled platforms
         if plat_enum in self.enabled_platforms:
             self.enabled_platforms.remove(plat_enum)
+            self._refresh_enabled()
         
         # Remove AI helper
-        if plat_enum in self.ai_helpers:
-            del self.ai_helpers[plat_enum]
+        self.ai_helpers.pop(plat_enum, None)
+        
+        # Forget matches that point at the stopped platform
+        with self._resolve_cache_lock:
+            self._resolve_cache.clear()
         
         logger.info(f"✅ Stopped {platform} platform") 
\ No newline at end of file
@@ -1,6 +1,22 @@
 # Kick.com platform integration package 
-from .kick_api import KickAPI
-from .kick_bot import KickModeratorBot
-from .kick_username_logger import KickUsernameLogger, KickAIModerationHelper
+import importlib
 
-__all__ = ['KickAPI', 'KickModeratorBot', 'KickUsernameLogger', 'KickAIModerationHelper'] 
\ No newline at end of file
+# Exports are loaded on first access (PEP 562) so importing one submodule
+# does not pull in the chat logger's WebSocket dependencies
+_EXPORTS = {
+    'KickAPI': '.kick_api',
+    'KickModeratorBot': '.kick_bot',
+    'KickUsernameLogger': '.kick_username_logger',
+    'KickAIModerationHelper': '.kick_username_logger',
+}
+
+__all__ = ['KickAPI', 'KickModeratorBot', 'KickUsernameLogger', 'KickAIModerationHelper']
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -13,10 +13,13 @@ logger.setLevel(logging.DEBUG)
 class KickAPI:
     """Kick.com API client with OAuth 2.1 authentication and moderation endpoints"""
     
-    def __init__(self):
+    def __init__(self, session=None):
         self.base_url = "https://api.kick.com/public/v1"
         self.oauth_url = "https://id.kick.com"
-        self.session = None
+        # A session handed in by the manager is shared with other platforms
+        # and closed by its owner, not by this client
+        self.session = session
+        self._owns_session = session is None
         self.access_token = None
         self.refresh_token = None
         # Always use Briann-24's user ID for all moderation and chat actions
@@ -26,7 +29,9 @@ class KickAPI:
     async def initialize(self):
         """Initialize the API client and authenticate"""
         try:
-            self.session = aiohttp.ClientSession()
+            if self.session is None:
+                self.session = aiohttp.ClientSession()
+                self._owns_session = True
             
             # If we have stored tokens, try to use them
             if Config.KICK_ACCESS_TOKEN:
@@ -428,7 +433,7 @@ class KickAPI:
     
     async def close(self):
         """Close the API client"""
-        if self.session and not self.session.closed:
+        if self.session and self._owns_session and not self.session.closed:
             await self.session.close()
             logger.debug("Kick API client closed")
         self.session = None
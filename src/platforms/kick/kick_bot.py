@@ -10,16 +10,17 @@ from .kick_api import KickAPI
 logger = logging.getLogger(__name__)
 
 class KickModeratorBot:
-    def __init__(self, command_callback=None):
+    def __init__(self, command_callback=None, session=None):
         """
         Initialize the Kick moderator bot using Kick API
         
         Args:
             command_callback: Callback function for when commands are executed
+            session: Optional shared aiohttp.ClientSession for API calls
         """
         self.command_callback = command_callback
-        self.api = KickAPI()
-        self.is_connected = False
+        self.api = KickAPI(session=session)
+        self.is_connected: bool = False
         
         # Track moderation actions for logging
         self.moderation_log = []
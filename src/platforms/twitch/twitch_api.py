@@ -12,9 +12,12 @@ logger = logging.getLogger(__name__)
 class TwitchHelixAPI:
     """Twitch Helix API client for moderation actions"""
     
-    def __init__(self):
+    def __init__(self, session=None):
         self.base_url = "https://api.twitch.tv/helix"
-        self.session = None
+        # A session handed in by the manager is shared with other platforms
+        # and closed by its owner, not by this client
+        self.session = session
+        self._owns_session = session is None
         self.access_token = None
         self.broadcaster_id = None
         self.moderator_id = None
@@ -23,7 +26,9 @@ class TwitchHelixAPI:
     async def initialize(self):
         """Initialize the API client and get necessary tokens"""
         try:
-            self.session = aiohttp.ClientSession()
+            if self.session is None:
+                self.session = aiohttp.ClientSession()
+                self._owns_session = True
             
             # Get access token
             await self._get_access_token()
@@ -393,9 +398,10 @@ class TwitchHelixAPI:
     
     async def close(self):
         """Close the API client"""
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
-            logger.info("Twitch API client closed")
+        self.session = None
+        logger.info("Twitch API client closed")
 
 class HelixRateLimiter:
     """Rate limiter for Twitch Helix API"""
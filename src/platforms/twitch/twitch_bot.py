@@ -10,16 +10,17 @@ from .twitch_api import TwitchHelixAPI
 logger = logging.getLogger(__name__)
 
 class TwitchModeratorBot:
-    def __init__(self, command_callback=None):
+    def __init__(self, command_callback=None, session=None):
         """
         Initialize the Twitch moderator bot using Helix API
         
         Args:
             command_callback: Callback function for when commands are executed
+            session: Optional shared aiohttp.ClientSession for API calls
         """
         self.command_callback = command_callback
-        self.api = TwitchHelixAPI()
-        self.is_connected = False
+        self.api = TwitchHelixAPI(session=session)
+        self.is_connected: bool = False
         
         # Track moderation actions for logging
         self.moderation_log = []
@@ -4,18 +4,66 @@ import queue
 import time
 import logging
 import io
-import wave
-import tempfile
-import os
+import struct
+import shutil
+import functools
 import requests
 import subprocess
-import asyncio
 from typing import Optional, Callable
 from ..core.config import Config
 from datetime import datetime
 
+# Optional in-process decoding of the stream audio (replaces the FFmpeg subprocess)
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    AV_AVAILABLE = False
+
+# Optional FLAC encoding of uploads to the HF endpoint (see HF_UPLOAD_CODEC)
+try:
+    import soundfile
+    SOUNDFILE_AVAILABLE = True
+except ImportError:
+    SOUNDFILE_AVAILABLE = False
+
+# Optional local voice activity detection before transcription
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except ImportError:
+    WEBRTCVAD_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# RIFF/WAVE header for 16-bit PCM: RIFF chunk, fmt chunk, data chunk header (44 bytes)
+_WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+
+
+@functools.lru_cache(maxsize=None)
+def _have_binary(name: str) -> bool:
+    """Check once whether an executable is on PATH, without spawning it"""
+    return shutil.which(name) is not None
+
+
+def _wav_envelope(pcm: bytes, sample_rate: int, channels: int) -> bytes:
+    """Wrap raw 16-bit PCM in a WAV header without going through the wave module"""
+    block_align = channels * 2
+    header = _WAV_HEADER.pack(
+        b'RIFF', 36 + len(pcm), b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, sample_rate * block_align, block_align, 16,
+        b'data', len(pcm)
+    )
+    return header + pcm
+
+# Filter out common Whisper hallucinations
+HALLUCINATION_PHRASES = frozenset({
+    'thank you', 'you', 'okay', 'thanks for watching', 'thanks for watching!',
+    'thank you for watching', 'thank you for watching!', 'thanks', 'obrigado',
+    'gracias', 'merci', 'danke', '.', '..', '...', 'um', 'uh', 'oh',
+    'yeah', 'yes', 'no', 'hi', 'hello', 'bye', 'goodbye'
+})
+
 class VoiceRecognitionHF:
     def __init__(self, command_callback: Callable[[str], None]):
         """
@@ -27,25 +75,45 @@ class VoiceRecognitionHF:
         self.command_callback = command_callback
         self.is_listening = False
         self.listen_thread = None
-        self.audio_queue = queue.Queue()
+        self.transcribe_thread = None
+        # Utterances waiting for transcription, in capture order. Bounded so a slow transcription
+        # backend can't let stale commands pile up; the oldest is dropped on overflow.
+        self.audio_queue = queue.Queue(maxsize=4)
         
         # Audio recording settings
         self.sample_rate = 16000  # Good quality for speech recognition
         self.chunk_size = 1024
         self.channels = 1
         
+        # Settings used on every utterance are fixed once the process starts; read them off Config only once
+        self.min_speech_volume = Config.VOICE_MIN_SPEECH_VOLUME
+        self.transcription_logging = Config.ENABLE_TRANSCRIPTION_LOGGING
+        self.whisper_beam_size = Config.WHISPER_BEAM_SIZE
+        self.vad_min_speech_ratio = Config.VOICE_VAD_MIN_SPEECH_RATIO
+        
+        # Local VAD so music/noise that passes the energy checks never reaches Whisper
+        self.vad = webrtcvad.Vad(Config.VOICE_VAD_MODE) if WEBRTCVAD_AVAILABLE else None
+        
         # Streamlink and FFmpeg processes for stream capture
         self.ffmpeg_process = None
         self.streamlink_process = None
         self.primary_stream_url = None
         self.primary_platform = None
         
+        # PyAV decoder state, used instead of FFmpeg when PyAV is installed
+        self._pcm_frames = None
+        self._pcm_buffer = bytearray()
+        
         # Transcription logging
         self.transcription_log_file = "stream_transcription.log"
         self._setup_transcription_logging()
         
-        # Initialize Hugging Face Inference Endpoint
-        self._setup_hf_endpoint()
+        # Initialize the transcription backend (local faster-whisper model or Hugging Face Inference Endpoint)
+        self.whisper_model = None
+        if Config.WHISPER_BACKEND == 'faster_whisper':
+            self._setup_local_whisper()
+        if self.whisper_model is None:
+            self._setup_hf_endpoint()
         
         # Determine primary audio source based on enabled platforms
         self._determine_primary_audio_source()
@@ -89,17 +157,16 @@ class VoiceRecognitionHF:
                 raise ValueError("No primary stream URL configured")
             
             # Test streamlink and FFmpeg availability
-            try:
-                subprocess.run(['streamlink', '--version'], capture_output=True, check=True)
-                logger.info("✅ Streamlink found and ready")
-            except (subprocess.CalledProcessError, FileNotFoundError):
+            if not _have_binary('streamlink'):
                 raise Exception("Streamlink not found. Please install streamlink to capture stream audio.")
+            logger.info("✅ Streamlink found and ready")
             
-            try:
-                subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
+            if AV_AVAILABLE:
+                logger.info("✅ PyAV found, decoding stream audio in-process")
+            else:
+                if not _have_binary('ffmpeg'):
+                    raise Exception("FFmpeg not found. Please install FFmpeg (or PyAV) to process stream audio.")
                 logger.info("✅ FFmpeg found and ready")
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                raise Exception("FFmpeg not found. Please install FFmpeg to process stream audio.")
             
             logger.info(f"✅ Stream setup successful for {self.primary_platform}: {self.primary_stream_url}")
             
@@ -117,20 +184,64 @@ class VoiceRecognitionHF:
             
             # Your deployed endpoint URL (replace with your actual endpoint)
             self.hf_endpoint_url = Config.HF_ENDPOINT_URL
+            # Upload codec: lossless FLAC is about half the size of WAV for speech
+            self.hf_upload_codec = 'wav'
+            if Config.HF_UPLOAD_CODEC == 'flac':
+                if SOUNDFILE_AVAILABLE:
+                    self.hf_upload_codec = 'flac'
+                else:
+                    logger.warning("⚠️ HF_UPLOAD_CODEC=flac but soundfile is not installed, uploading WAV")
+            
             self.hf_headers = {
                 "Authorization": f"Bearer {Config.HF_API_TOKEN}",
-                "Content-Type": "audio/wav"
+                "Content-Type": f"audio/{self.hf_upload_codec}"
             }
             
+            # One keep-alive session so every utterance reuses the TCP + TLS connection
+            self.hf_session = requests.Session()
+            self.hf_session.headers.update(self.hf_headers)
+            
             logger.info("✅ Hugging Face Inference Endpoint setup successful")
             
         except Exception as e:
             logger.error(f"Failed to setup HF endpoint: {e}")
             raise
     
+    def _setup_local_whisper(self):
+        """Load a local faster-whisper model, leaving whisper_model unset to fall back to the HF endpoint"""
+        # Imported here so the default HF backend never pays for loading CTranslate2
+        try:
+            import ctranslate2
+            from faster_whisper import WhisperModel
+        except ImportError:
+            logger.warning("⚠️ WHISPER_BACKEND=faster_whisper but faster-whisper is not installed, using HF endpoint")
+            return
+        
+        try:
+            device = Config.WHISPER_DEVICE
+            if device == 'auto':
+                device = 'cuda' if ctranslate2.get_cuda_device_count() > 0 else 'cpu'
+            compute_type = Config.WHISPER_COMPUTE_TYPE or ('int8_float16' if device == 'cuda' else 'int8')
+            
+            logger.info(f"Loading faster-whisper model '{Config.WHISPER_MODEL}' on {device} ({compute_type})...")
+            self.whisper_model = WhisperModel(Config.WHISPER_MODEL, device=device, compute_type=compute_type)
+            
+            # Warm up on a second of silence so device init and kernel selection don't land on the
+            # first real command (VAD off, otherwise the silence is dropped before decoding)
+            segments, _ = self.whisper_model.transcribe(
+                np.zeros(self.sample_rate, dtype=np.float32), beam_size=self.whisper_beam_size, language='en'
+            )
+            for _ in segments:
+                pass
+            logger.info("✅ Local faster-whisper model ready")
+            
+        except Exception as e:
+            logger.error(f"Failed to load faster-whisper model, using HF endpoint: {e}")
+            self.whisper_model = None
+    
     def _setup_transcription_logging(self):
         """Setup transcription logging to file"""
-        if not Config.ENABLE_TRANSCRIPTION_LOGGING:
+        if not self.transcription_logging:
             logger.info("Transcription logging disabled in configuration")
             return
             
@@ -154,7 +265,7 @@ class VoiceRecognitionHF:
     
     def _log_transcription(self, text: str):
         """Log transcribed text to file with timestamp"""
-        if not Config.ENABLE_TRANSCRIPTION_LOGGING:
+        if not self.transcription_logging:
             return
             
         try:
@@ -181,6 +292,11 @@ class VoiceRecognitionHF:
             logger.error("No audio source configured - cannot start voice recognition")
             return
         
+        # A worker still finishing a transcription from the last session would run alongside the new one
+        if any(thread and thread.is_alive() for thread in (self.listen_thread, self.transcribe_thread)):
+            logger.warning("Previous voice recognition threads are still stopping - try again shortly")
+            return
+        
         try:
             # Start FFmpeg process to capture stream audio
             self._start_ffmpeg_capture()
@@ -191,6 +307,10 @@ class VoiceRecognitionHF:
             self.listen_thread = threading.Thread(target=self._process_audio_loop, daemon=True)
             self.listen_thread.start()
             
+            # Start the transcription worker
+            self.transcribe_thread = threading.Thread(target=self._transcription_worker, daemon=True)
+            self.transcribe_thread.start()
+            
             logger.info(f"🎤 Voice recognition started with {self.primary_platform} stream audio capture")
             
         except Exception as e:
@@ -227,6 +347,17 @@ class VoiceRecognitionHF:
         if self.listen_thread and self.listen_thread.is_alive():
             self.listen_thread.join(timeout=2)
         
+        if self.transcribe_thread and self.transcribe_thread.is_alive():
+            self.transcribe_thread.join(timeout=2)
+        
+        # Utterances captured before the stop must not be transcribed after a restart
+        self._drain_audio_queue()
+        # The reader thread slices _pcm_buffer without a lock, so only reset the decoder state once
+        # it has exited; a reader still alive is left alone and start_listening waits for it
+        if not (self.listen_thread and self.listen_thread.is_alive()):
+            self._pcm_frames = None
+            self._pcm_buffer.clear()
+        
         logger.info("Voice recognition stopped")
     
     def _start_ffmpeg_capture(self):
@@ -267,6 +398,14 @@ class VoiceRecognitionHF:
                 stderr=subprocess.PIPE
             )
             
+            if AV_AVAILABLE:
+                # Decode streamlink's output in this process, no FFmpeg subprocess or second pipe
+                self.streamlink_process = streamlink_process
+                self._pcm_buffer.clear()
+                self._pcm_frames = self._decode_stream_pcm(streamlink_process.stdout)
+                logger.info(f"Started streamlink + PyAV capture for {self.primary_platform}: {self.primary_stream_url}")
+                return
+            
             # FFmpeg command to process the stream from streamlink
             ffmpeg_cmd = [
                 'ffmpeg',
@@ -300,8 +439,41 @@ class VoiceRecognitionHF:
             logger.error(f"Failed to start streamlink capture: {e}")
             raise
     
+    def _decode_stream_pcm(self, stream):
+        """Decode the stream container to 16-bit mono PCM at the capture sample rate, yielding bytes per frame"""
+        with av.open(stream) as container:
+            resampler = av.AudioResampler(format='s16', layout='mono', rate=self.sample_rate)
+            for frame in container.decode(audio=0):
+                for resampled in resampler.resample(frame):
+                    yield resampled.to_ndarray().tobytes()
+            # Flush the samples the resampler still holds at end of stream
+            for resampled in resampler.resample(None):
+                yield resampled.to_ndarray().tobytes()
+    
+    def _read_audio_from_decoder(self):
+        """Read one chunk of audio data from the PyAV decoder"""
+        chunk_bytes = self.chunk_size * 2
+        try:
+            while len(self._pcm_buffer) < chunk_bytes:
+                self._pcm_buffer += next(self._pcm_frames)
+        except StopIteration:
+            # End of stream
+            self._pcm_frames = None
+            return None
+        except Exception as e:
+            logger.error(f"Error decoding stream audio: {e}")
+            self._pcm_frames = None
+            return None
+        
+        audio_data = bytes(self._pcm_buffer[:chunk_bytes])
+        del self._pcm_buffer[:chunk_bytes]
+        return audio_data
+    
     def _read_audio_from_ffmpeg(self):
         """Read audio data from FFmpeg process"""
+        if self._pcm_frames is not None:
+            return self._read_audio_from_decoder()
+        
         try:
             if not self.ffmpeg_process or self.ffmpeg_process.poll() is not None:
                 return None
@@ -324,10 +496,12 @@ class VoiceRecognitionHF:
         """Main audio processing loop that runs in a separate thread"""
         logger.info("Starting audio processing loop...")
         
-        audio_buffer = []
         silence_threshold = 1500
         min_audio_length = self.sample_rate * 2  # 2 seconds minimum 
         max_audio_length = self.sample_rate * 8  # 8 seconds maximum 
+        # Utterance buffer, allocated once and filled in place (room for one chunk past the maximum)
+        audio_buffer = np.empty(max_audio_length + self.chunk_size, dtype=np.int16)
+        total_length = 0  # Samples currently in audio_buffer
         silence_duration = 0
         max_silence = self.sample_rate * 3  # 3 seconds of silence to trigger processing 
         
@@ -340,55 +514,75 @@ class VoiceRecognitionHF:
                     continue
                 
                 # Add to buffer
-                audio_buffer.append(audio_chunk)
-                
-                # Convert to numpy for silence detection
                 audio_data = np.frombuffer(audio_chunk, dtype=np.int16)
+                audio_buffer[total_length:total_length + len(audio_data)] = audio_data
+                total_length += len(audio_data)
                 
                 # Simple silence detection like microphone version - just check max amplitude
-                if np.max(np.abs(audio_data)) < silence_threshold:
+                # (min/max instead of np.abs: no temporary array, and no int16 overflow at -32768)
+                if audio_data.max() < silence_threshold and audio_data.min() > -silence_threshold:
                     silence_duration += len(audio_data)
                 else:
                     silence_duration = 0
                 
-                # Calculate total buffer length
-                total_length = sum(len(np.frombuffer(chunk, dtype=np.int16)) for chunk in audio_buffer)
-                
                 # Process audio if we have enough and there's been silence (like microphone version)
                 if (total_length >= min_audio_length and 
                     silence_duration >= max_silence) or total_length >= max_audio_length:
                     
                     if total_length >= min_audio_length:
-                        # Process the audio buffer
-                        threading.Thread(
-                            target=self._transcribe_audio, 
-                            args=(audio_buffer.copy(),), 
-                            daemon=True
-                        ).start()
+                        # Hand a copy of the utterance to the transcription worker
+                        self._enqueue_utterance(audio_buffer[:total_length].copy())
                     
                     # Reset buffer
-                    audio_buffer = []
+                    total_length = 0
                     silence_duration = 0
                 
             except Exception as e:
                 logger.error(f"Error in audio processing loop: {e}")
                 time.sleep(0.1)
     
-    def _transcribe_audio(self, audio_chunks):
-        """Transcribe audio using Hugging Face Inference Endpoint"""
+    def _enqueue_utterance(self, audio_array: np.ndarray):
+        """Queue an utterance for transcription, dropping the oldest one if the queue is full"""
+        while True:
+            try:
+                self.audio_queue.put_nowait(audio_array)
+                return
+            except queue.Full:
+                try:
+                    self.audio_queue.get_nowait()
+                    logger.warning("⚠️ Transcription is falling behind - dropped the oldest queued utterance")
+                except queue.Empty:
+                    pass
+    
+    def _drain_audio_queue(self):
+        """Discard every utterance still waiting for transcription"""
+        while True:
+            try:
+                self.audio_queue.get_nowait()
+            except queue.Empty:
+                return
+    
+    def _transcription_worker(self):
+        """Transcribe queued utterances one at a time so results reach the callback in speaking order"""
+        while self.is_listening:
+            try:
+                audio_array = self.audio_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._transcribe_audio(audio_array)
+    
+    def _transcribe_audio(self, audio_array: np.ndarray):
+        """Transcribe int16 audio with the configured backend and forward the text to the command callback"""
         try:
-            # Combine audio chunks
-            audio_data = b''.join(audio_chunks)
-            
             # Check minimum length (like microphone version)
-            audio_array = np.frombuffer(audio_data, dtype=np.int16)
             if len(audio_array) < self.sample_rate * 0.5:  # Less than 0.5 seconds
                 return
             
             # Check if audio has sufficient volume/energy to be actual speech
             # Calculate RMS (Root Mean Square) to get average volume level
-            rms = np.sqrt(np.mean(audio_array.astype(float) ** 2))
-            min_speech_volume = Config.VOICE_MIN_SPEECH_VOLUME
+            squared = np.square(audio_array, dtype=np.float64)
+            rms = np.sqrt(squared.mean())
+            min_speech_volume = self.min_speech_volume
             
             if rms < min_speech_volume:
                 return
@@ -396,83 +590,105 @@ class VoiceRecognitionHF:
             # Check for consistent audio energy (not just brief spikes)
             # Split into segments and check if enough segments have decent volume
             segment_length = self.sample_rate // 4  # 0.25 second segments
-            segments = [audio_array[i:i+segment_length] for i in range(0, len(audio_array), segment_length)]
-            
-            active_segments = 0
-            for segment in segments:
-                if len(segment) > 0:
-                    segment_rms = np.sqrt(np.mean(segment.astype(float) ** 2))
-                    if segment_rms > min_speech_volume * 0.5:  # Lower threshold for segments
-                        active_segments += 1
+            starts = np.arange(0, len(squared), segment_length)
+            segment_sizes = np.diff(np.append(starts, len(squared)))
+            segment_rms = np.sqrt(np.add.reduceat(squared, starts) / segment_sizes)
+            active_segments = np.count_nonzero(segment_rms > min_speech_volume * 0.5)  # Lower threshold for segments
             
             # Require at least 30% of segments to have decent audio
-            if active_segments / len(segments) < 0.3:
+            if active_segments / len(starts) < 0.3:
                 return
             
-            # Create WAV file in memory
-            wav_buffer = io.BytesIO()
-            with wave.open(wav_buffer, 'wb') as wav_file:
-                wav_file.setnchannels(self.channels)
-                wav_file.setsampwidth(2)  # 16-bit = 2 bytes
-                wav_file.setframerate(self.sample_rate)
-                wav_file.writeframes(audio_data)
-            
-            wav_buffer.seek(0)
-            
-            # Send to Hugging Face Inference Endpoint
-            response = requests.post(
-                self.hf_endpoint_url,
-                headers=self.hf_headers,
-                data=wav_buffer.getvalue(),
-                timeout=30
-            )
+            # Skip the transcription entirely if the local VAD hears no speech
+            if self.vad is not None and not self._has_speech(audio_array):
+                return
             
-            if response.status_code == 200:
-                result = response.json()
-                text = result.get('text', '').strip().lower()
-                
-                # Filter out common Whisper hallucinations
-                hallucination_phrases = {
-                    'thank you', 'you', 'okay', 'thanks for watching', 'thanks for watching!',
-                    'thank you for watching', 'thank you for watching!', 'thanks', 'obrigado',
-                    'gracias', 'merci', 'danke', '.', '..', '...', 'um', 'uh', 'oh',
-                    'yeah', 'yes', 'no', 'hi', 'hello', 'bye', 'goodbye'
-                }
-                
-                # Check if the entire text is just a hallucination
-                if text in hallucination_phrases:
-                    return
-                
-                # Check if text is too short and likely a hallucination
-                if len(text.strip()) <= 2:
-                    return
+            if self.whisper_model is not None:
+                text = self._transcribe_local(audio_array)
+            else:
+                text = self._transcribe_hf(audio_array)
+            if text is None:
+                return
+            text = text.strip().lower()
+            
+            # Check if the entire text is just a hallucination
+            if text in HALLUCINATION_PHRASES:
+                return
+            
+            # Check if text is too short and likely a hallucination
+            if len(text.strip()) <= 2:
+                return
+            
+            if text:
+                # Log ALL transcribed text to file (real-time streamer speech)
+                self._log_transcription(text)
                 
-                if text:
-                    # Log ALL transcribed text to file (real-time streamer speech)
-                    self._log_transcription(text)
+                # Check if the activation keyword is present for commands (with flexible matching)
+                has_activation_keyword, _, keyword_end = Config.find_activation_keyword(text)
+                if has_activation_keyword:
+                    # Extract command after the activation keyword
+                    command = text[keyword_end:].rstrip()
                     
-                    # Check if the activation keyword is present for commands (with flexible matching)
-                    has_activation_keyword, _, _ = Config.find_activation_keyword(text)
-                    if has_activation_keyword:
-                        # Extract command after the activation keyword
-                        command = Config.extract_command_after_keyword(text)
-                        
-                        if command:
-                            logger.info(f"🎯 Voice command: {command}")
-                        else:
-                            logger.info(f"🎯 Activation keyword detected: {Config.VOICE_ACTIVATION_KEYWORD}")
-                        
-                        # Always pass the full text to the callback when activation keyword is found
-                        self.command_callback(text)
+                    if command:
+                        logger.info(f"🎯 Voice command: {command}")
                     else:
-                        # Also pass text without activation keyword to allow sentence combining
-                        # The web interface will decide if it should be combined with pending commands
-                        self.command_callback(text)
-            else:
-                logger.error(f"HF Endpoint error: {response.status_code} - {response.text}")
+                        logger.info(f"🎯 Activation keyword detected: {Config.VOICE_ACTIVATION_KEYWORD}")
+                    
+                    # Always pass the full text to the callback when activation keyword is found
+                    self.command_callback(text)
+                else:
+                    # Also pass text without activation keyword to allow sentence combining
+                    # The web interface will decide if it should be combined with pending commands
+                    self.command_callback(text)
             
         except Exception as e:
-            logger.error(f"Error transcribing audio with HF endpoint: {e}")
+            logger.error(f"Error transcribing audio: {e}")
+    
+    def _has_speech(self, audio_array: np.ndarray) -> bool:
+        """Check whether enough 30 ms frames contain speech according to the local VAD"""
+        frame_bytes = self.sample_rate * 30 // 1000 * 2
+        pcm = audio_array.tobytes()
+        frame_count = len(pcm) // frame_bytes
+        if frame_count == 0:
+            return False
+        
+        speech_frames = sum(
+            self.vad.is_speech(pcm[offset:offset + frame_bytes], self.sample_rate)
+            for offset in range(0, frame_count * frame_bytes, frame_bytes)
+        )
+        return speech_frames / frame_count >= self.vad_min_speech_ratio
+    
+    def _transcribe_local(self, audio_array: np.ndarray) -> str:
+        """Transcribe int16 PCM with the local faster-whisper model"""
+        segments, _ = self.whisper_model.transcribe(
+            audio_array.astype(np.float32) / 32768.0,
+            beam_size=self.whisper_beam_size,
+            vad_filter=True
+        )
+        return ''.join(segment.text for segment in segments)
+    
+    def _transcribe_hf(self, audio_array: np.ndarray) -> Optional[str]:
+        """Transcribe int16 PCM with the Hugging Face Inference Endpoint, None on error"""
+        # Encode the upload in memory
+        if self.hf_upload_codec == 'flac':
+            flac_buffer = io.BytesIO()
+            soundfile.write(flac_buffer, audio_array, self.sample_rate, format='FLAC', subtype='PCM_16')
+            upload_data = flac_buffer.getvalue()
+        else:
+            upload_data = _wav_envelope(audio_array.tobytes(), self.sample_rate, self.channels)
+        
+        # Send to Hugging Face Inference Endpoint
+        response = self.hf_session.post(
+            self.hf_endpoint_url,
+            data=upload_data,
+            timeout=(5, 30)
+        )
+        
+        if response.status_code != 200:
+            logger.error(f"HF Endpoint error: {response.status_code} - {response.text}")
+            return None
+        
+        return response.json().get('text', '')
     
     def __del__(self):
         """Cleanup when object is destroyed"""
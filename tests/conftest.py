@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Pin the settings the tests depend on before src.core.config reads the environment
+os.environ["AI_PARSE_CACHE_PATH"] = ""
+os.environ["LOCAL_INTENT_MODEL"] = ""
+os.environ["OPENAI_API_KEY"] = ""
+os.environ["VOICE_ACTIVATION_KEYWORD"] = "hey brian"
+os.environ["DEFAULT_TIMEOUT_DURATION"] = "600"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
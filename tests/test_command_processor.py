@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+
+from src.core.command_processor import CommandProcessor, ModerationCommand, _JsonObjectTracker
+
+
+@pytest.fixture
+def processor():
+    return CommandProcessor()
+
+
+@pytest.mark.parametrize("text, action, username, duration, reason", [
+    ("ban bob", "ban", "bob", None, None),
+    ("Permanently ban Bob.", "ban", "bob", None, None),
+    ("ban bob for spamming", "ban", "bob", None, "spamming"),
+    ("ban bob because he was rude", "ban", "bob", None, "he was rude"),
+    ("ban bob reason: slurs", "ban", "bob", None, "slurs"),
+    ("unban bob", "unban", "bob", None, None),
+    ("unben bob", "unban", "bob", None, None),
+    ("timeout bob", "timeout", "bob", 600, None),
+    ("timeout bob for 10 minutes", "timeout", "bob", 600, None),
+    ("mute bob 30 secs", "timeout", "bob", 30, None),
+    ("timeout bob 2 hours for spamming", "timeout", "bob", 7200, "spamming"),
+    ("untimeout bob", "untimeout", "bob", None, None),
+    ("remove the timeout on bob", "untimeout", "bob", None, None),
+    ("restrict bob", "restrict", "bob", None, None),
+    ("unrestrict bob", "unrestrict", "bob", None, None),
+    ("clear the chat", "clear", None, None, None),
+    ("slow mode", "slow", None, 10, None),
+    ("slow mode 30 seconds", "slow", None, 30, None),
+    ("disable slow mode", "slow_off", None, None, None),
+    ("slow mode off", "slow_off", None, None, None),
+    ("followers only", "followers_only", None, 1, None),
+    ("followers only 10 minutes", "followers_only", None, 600, None),
+    ("turn off followers only", "followers_off", None, None, None),
+    ("sub only mode", "subscribers_only", None, None, None),
+    ("sub mode", "subscribers_only", None, None, None),
+    ("subs off", "subscribers_off", None, None, None),
+    ("emote only", "emote_only", None, None, None),
+    ("emotes off", "emote_off", None, None, None),
+])
+def test_templates(processor, text, action, username, duration, reason):
+    assert processor._pattern_match_command(text) == ModerationCommand(
+        action=action, username=username, duration=duration, reason=reason
+    )
+
+
+@pytest.mark.parametrize("text", [
+    "hello there",
+    "ban bob and then some more words",
+    "remove the timeout for",
+    "set the weather to london",
+    "timeout bob for an hour",
+    "mute bob for five minutes",
+    "timeout bob for a day",
+    "timeout bob for half an hour",
+    "timeout bob for ten minutes for spamming",
+    "ban bob for a week",
+])
+def test_templates_leave_other_text_to_the_ai(processor, text):
+    assert processor._pattern_match_command(text) is None
+
+
+def test_json_tracker_closes_on_outer_brace():
+    tracker = _JsonObjectTracker()
+    assert not tracker.feed('{"action": "ban", ')
+    assert not tracker.feed('"extra": {"a": 1}')
+    assert tracker.feed('}')
+
+
+def test_json_tracker_ignores_braces_in_strings():
+    tracker = _JsonObjectTracker()
+    assert not tracker.feed('{"reason": "a } b { c", ')
+    assert not tracker.feed('"username": "x\\"}"')
+    assert tracker.feed('}  trailing')
+
+
+def test_json_tracker_handles_escapes_split_across_fragments():
+    tracker = _JsonObjectTracker()
+    assert not tracker.feed('{"reason": "quote \\')
+    assert not tracker.feed('"}')
+    assert tracker.feed('"}')
+
+
+@pytest.mark.parametrize("text, parts", [
+    ("ban alice, timeout bob", ["ban alice", "timeout bob"]),
+    ("ban alice and then clear chat", ["ban alice", "clear chat"]),
+    ("slow mode; sub only mode", ["slow mode", "sub only mode"]),
+    ("timeout bob for being rude, then clear chat", ["timeout bob for being rude", "clear chat"]),
+    ("timeout bob for 10 minutes and ban alice for spamming", ["timeout bob for 10 minutes", "ban alice for spamming"]),
+])
+def test_split_compound_command(processor, text, parts):
+    assert processor.split_compound_command(text) == parts
+
+
+@pytest.mark.parametrize("text", [
+    "ban bob for spamming and trolling",
+    "timeout bob because he was rude, loud and annoying",
+    "clear the chat",
+    "ban bob",
+])
+def test_split_compound_command_keeps_single_commands_whole(processor, text):
+    assert processor.split_compound_command(text) == [text]
+
+
+def test_batch_parses_serve_repeats_and_later_bursts_from_cache(processor):
+    sent = []
+
+    async def fake_parse_batch(command_texts):
+        sent.append(command_texts)
+        return [('weather', None, None, None, text.rsplit(' ', 1)[-1]) for text in command_texts]
+
+    processor.openai_client = object()
+    processor._ai_parse_batch = fake_parse_batch
+
+    async def run():
+        first = await processor.process_commands(["weather in paris", "Weather in Paris.", "weather in rome"])
+        second = await processor.process_commands(["weather in rome", "weather in oslo"])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert sent == [["weather in paris", "weather in rome"], ["weather in oslo"]]
+    assert [cmd.weather_location for cmd in first] == ["paris", "paris", "rome"]
+    assert [cmd.weather_location for cmd in second] == ["rome", "oslo"]
+
+
+def test_concurrent_commands_resolve_usernames_one_at_a_time(processor):
+    class SlowHelper:
+        active = 0
+        most_active = 0
+
+        def resolve_username(self, spoken_username):
+            SlowHelper.active += 1
+            SlowHelper.most_active = max(SlowHelper.most_active, SlowHelper.active)
+            time.sleep(0.02)
+            SlowHelper.active -= 1
+            return spoken_username
+
+    processor.set_phonetic_helper(SlowHelper())
+
+    async def run():
+        return await asyncio.gather(*(processor.process_command(f"ban user{i}") for i in range(4)))
+
+    commands = asyncio.run(run())
+    assert [cmd.username for cmd in commands] == ["user0", "user1", "user2", "user3"]
+    assert SlowHelper.most_active == 1
@@ -0,0 +1,47 @@
+import pytest
+
+from src.core.config import Config, _compile_activation_re
+
+
+@pytest.mark.parametrize("text, command", [
+    ("hey brian ban bob", "ban bob"),
+    ("Hey, Brian. ban bob", "ban bob"),
+    ("hey brian! clear chat", "clear chat"),
+    ("so hey, brian, timeout bob", "timeout bob"),
+])
+def test_activation_re_ends_where_the_command_starts(text, command):
+    match = _compile_activation_re("hey brian").search(text)
+    assert match is not None
+    assert text[match.end():] == command
+
+
+@pytest.mark.parametrize("text", ["they brian ban bob", "hey brianna", "hey there brian", "ban bob"])
+def test_activation_re_needs_the_whole_keyword(text):
+    assert _compile_activation_re("hey brian").search(text) is None
+
+
+def test_activation_re_escapes_keyword_words():
+    pattern = _compile_activation_re("mr. bot")
+    assert pattern.search("mr. bot clear chat")
+    assert not pattern.search("mrx bot clear chat")
+
+
+def test_find_activation_keyword():
+    found, start, end = Config.find_activation_keyword("well Hey Brian, slow mode")
+    assert found
+    assert (start, end) == (5, 16)
+    assert Config.find_activation_keyword("just chatting") == (False, -1, -1)
+
+
+def test_extract_command_after_keyword():
+    assert Config.extract_command_after_keyword("hey brian, ban bob. ") == "ban bob."
+    assert Config.extract_command_after_keyword("ban bob") == "ban bob"
+
+
+def test_set_twitch_channel_normalizes():
+    previous = Config.TWITCH_CHANNEL
+    try:
+        Config.set_twitch_channel("  #Some_Channel ")
+        assert Config.TWITCH_CHANNEL == "some_channel"
+    finally:
+        Config.TWITCH_CHANNEL = previous
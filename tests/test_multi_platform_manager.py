@@ -0,0 +1,99 @@
+import asyncio
+
+from src.core.command_processor import CommandProcessor
+from src.core.multi_platform_manager import MultiPlatformManager, Platform
+
+
+class FakeHelper:
+    def __init__(self, names):
+        self.names = names
+        self.lookups = []
+
+    def resolve_username(self, spoken_username):
+        self.lookups.append(spoken_username)
+        return self.names.get(spoken_username.lower())
+
+
+class FakeBot:
+    def __init__(self):
+        self.is_connected = True
+        self.executed = []
+
+    async def execute_moderation_command(self, cmd):
+        self.executed.append((cmd.action, cmd.username))
+        return True
+
+
+def make_manager():
+    manager = MultiPlatformManager()
+    manager.enabled_platforms = {Platform.TWITCH, Platform.KICK}
+    manager._refresh_enabled()
+    manager.bots = {Platform.TWITCH: FakeBot(), Platform.KICK: FakeBot()}
+    manager.ai_helpers = {
+        Platform.TWITCH: FakeHelper({'alice': 'alice_tw', 'bob': 'bob_tw'}),
+        Platform.KICK: FakeHelper({'alice': 'alice_kick', 'bob': 'bob_kick'}),
+    }
+    return manager
+
+
+def test_resolve_username_map_keeps_each_platform_match():
+    manager = make_manager()
+    assert manager.resolve_username_map('Alice') == {Platform.TWITCH: 'alice_tw', Platform.KICK: 'alice_kick'}
+    assert manager.resolve_username_map('carol') == {}
+    assert manager.resolve_username_across_platforms('bob') == 'bob_tw'
+
+
+def test_resolve_usernames_batch_matches_repeated_names_once():
+    manager = make_manager()
+    assert manager.resolve_usernames_batch(['bob', 'carol', 'bob']) == {
+        'bob': {Platform.TWITCH: 'bob_tw', Platform.KICK: 'bob_kick'},
+        'carol': {},
+    }
+    assert manager.ai_helpers[Platform.TWITCH].lookups == ['bob', 'carol']
+
+
+def test_compound_parts_keep_their_own_targets():
+    manager = make_manager()
+    processor = CommandProcessor()
+    processor.set_phonetic_helper(manager)
+    parts = processor.split_compound_command("ban alice, timeout bob")
+
+    async def run():
+        # Every part is resolved before any of them executes, as in the web voice handler
+        commands = await processor.process_commands(parts)
+        for cmd in commands:
+            await manager.execute_command_on_enabled_platforms(cmd)
+
+    asyncio.run(run())
+    assert manager.bots[Platform.TWITCH].executed == [('ban', 'alice_tw'), ('timeout', 'bob_tw')]
+    assert manager.bots[Platform.KICK].executed == [('ban', 'alice_kick'), ('timeout', 'bob_kick')]
+
+
+def test_command_without_resolution_runs_on_all_platforms():
+    manager = make_manager()
+    processor = CommandProcessor()
+    processor.set_phonetic_helper(manager)
+
+    async def run():
+        cmd = await processor.process_command("clear the chat")
+        return await manager.execute_command_on_enabled_platforms(cmd)
+
+    assert asyncio.run(run()) == {Platform.TWITCH: True, Platform.KICK: True}
+    assert manager.bots[Platform.KICK].executed == [('clear', None)]
+
+
+def test_initialize_closes_the_http_session_when_every_platform_fails():
+    manager = MultiPlatformManager()
+
+    async def failing_initializer():
+        manager._get_http_session()
+        raise ValueError("bad credentials")
+
+    manager._initialize_twitch = failing_initializer
+    manager._initialize_kick = failing_initializer
+
+    async def run():
+        assert await manager.initialize(['twitch', 'kick']) is False
+        return manager._http_session
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,18 @@
+import io
+import wave
+
+import pytest
+
+from src.voice.voice_recognition_hf import _wav_envelope
+
+
+@pytest.mark.parametrize("sample_rate, channels, frames", [(16000, 1, 0), (16000, 1, 1600), (44100, 2, 441)])
+def test_wav_envelope_matches_wave_module(sample_rate, channels, frames):
+    pcm = bytes(range(256)) * (frames * channels * 2 // 256) + bytes(frames * channels * 2 % 256)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    assert _wav_envelope(pcm, sample_rate, channels) == buffer.getvalue()
@@ -5,40 +5,68 @@ A FastAPI-based backend to control the bot
 """
 
 import asyncio
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import sys
 from typing import Optional, Dict, Any, Set, List
 from datetime import datetime
 import json
-import threading
-from threading import Timer
 import time
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 import uvicorn
 
 # Import bot components
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from src.core.config import Config
-from src.voice.voice_recognition_hf import VoiceRecognitionHF
-from src.core.command_processor import CommandProcessor, ModerationCommand, CommandSessionLogger
-from src.core.multi_platform_manager import MultiPlatformManager, Platform
-from src.platforms.twitch.twitch_bot import TwitchModeratorBot
-from src.platforms.twitch.twitch_username_logger import TwitchUsernameLogger, TwitchAIModerationHelper
+from src.core.command_processor import CommandProcessor, ModerationCommand, CommandSessionLogger, DANGEROUS_ACTIONS
+from src.core.multi_platform_manager import MultiPlatformManager
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
+def _setup_logging():
+    """Send log records through a queue so console writes happen on a listener thread, not the event loop"""
+    if logging.getLogger().handlers:
+        return
+    log_queue = queue.SimpleQueue()
+    logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(log_queue)])
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+_setup_logging()
 logger = logging.getLogger(__name__)
 
+# Indexed by the success flag of an executed command
+_STATUS = ("❌ FAILED", "✅ SUCCESS")
+_STATUS_ICON = ("❌", "✅")
+# Twitch login names: 3-25 letters, digits or underscores (checked after normalizing)
+_TWITCH_CHANNEL_RE = re.compile(r'^[a-z0-9_]{3,25}$')
+
 # Pydantic models for API
 class BotConfig(BaseModel):
     twitch_channel: Optional[str] = None
     kick_channel: Optional[str] = None
     platforms: List[str] = ['twitch']  # Default to Twitch only
+    
+    @field_validator('twitch_channel')
+    @classmethod
+    def _normalize_twitch_channel(cls, channel: Optional[str]) -> Optional[str]:
+        """Normalize like Config.set_twitch_channel and reject names Twitch can't have"""
+        if not channel:
+            return channel
+        channel = channel.strip().lstrip('#').lower()
+        if not _TWITCH_CHANNEL_RE.match(channel):
+            raise ValueError(f"Invalid Twitch channel name: '{channel}'")
+        return channel
 
 class BotStatus(BaseModel):
     is_running: bool
@@ -57,7 +85,16 @@ class CommandRequest(BaseModel):
 bot_instance = None
 websocket_connections = []
 
-app = FastAPI(title="Twitch AI Moderator Bot", description="Web interface for voice-controlled Twitch moderation")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Stop the bot and release its worker threads when the server shuts down"""
+    yield
+    if bot_instance:
+        if bot_instance.is_running:
+            await bot_instance.stop()
+        bot_instance.shutdown_executor()
+
+app = FastAPI(title="Twitch AI Moderator Bot", description="Web interface for voice-controlled Twitch moderation", lifespan=lifespan)
 
 class WebAIModeratorBot:
     def __init__(self):
@@ -70,6 +107,10 @@ class WebAIModeratorBot:
         self.last_command_time = None
         self.websockets = set()
         self.event_loop = None
+        self._voice_queue = None
+        self._voice_consumer_task = None
+        self._background_tasks = set()
+        self._executor = None
         
         # Components
         self.multi_platform_manager = None
@@ -88,6 +129,12 @@ class WebAIModeratorBot:
             # Store reference to the current event loop
             self.event_loop = asyncio.get_running_loop()
             
+            # Python 3.12+: run new tasks (platform bring-up, command fan-out, chat notices) eagerly
+            # up to their first real suspension instead of waiting for the next loop iteration
+            if hasattr(asyncio, 'eager_task_factory') and self.event_loop.get_task_factory() is None:
+                self.event_loop.set_task_factory(asyncio.eager_task_factory)
+            self._voice_queue = asyncio.Queue()
+            
             # Set channels for enabled platforms
             self.enabled_platforms = config.platforms
             self.current_channels = {}
@@ -96,8 +143,8 @@ class WebAIModeratorBot:
             
             if 'twitch' in config.platforms and config.twitch_channel:
                 Config.set_twitch_channel(config.twitch_channel)
-                self.current_channels['twitch'] = config.twitch_channel
-                logger.info(f"🔧 Twitch channel set to: {config.twitch_channel}")
+                self.current_channels['twitch'] = Config.TWITCH_CHANNEL
+                logger.info(f"🔧 Twitch channel set to: {Config.TWITCH_CHANNEL}")
             
             if 'kick' in config.platforms and config.kick_channel:
                 Config.set_kick_channel(config.kick_channel)
@@ -117,14 +164,14 @@ class WebAIModeratorBot:
                 raise Exception("Failed to initialize multi-platform manager")
             
             # Initialize command processor with the multi-platform manager
-            from src.core.command_processor import CommandProcessor
             self.command_processor = CommandProcessor()
             
             # Set up the multi-platform manager for cross-platform username resolution
             if self.multi_platform_manager:
                 self.command_processor.set_phonetic_helper(self.multi_platform_manager)
             
-            # Initialize voice recognition
+            # Initialize voice recognition (imported here so serving the UI doesn't load the audio stack)
+            from src.voice.voice_recognition_hf import VoiceRecognitionHF
             self.voice_recognition = VoiceRecognitionHF(command_callback=self._on_voice_command)
             
             await self.broadcast_status()
@@ -162,9 +209,21 @@ class WebAIModeratorBot:
             # Ensure we have the event loop reference
             if not self.event_loop:
                 self.event_loop = asyncio.get_running_loop()
+            
+            # Blocking helpers (asyncio.to_thread: username resolution, local intent model) only
+            # need a few threads, not the default min(32, cpu_count + 4) pool
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="modbot")
+                self.event_loop.set_default_executor(self._executor)
                 
             self.is_running = True
             
+            # Drain voice transcripts one at a time so split sentences are combined in order
+            if self._voice_queue is None:
+                self._voice_queue = asyncio.Queue()
+            if self._voice_consumer_task is None or self._voice_consumer_task.done():
+                self._voice_consumer_task = asyncio.create_task(self._voice_command_consumer())
+            
             # Start multi-platform manager
             if self.multi_platform_manager:
                 # Start platforms in background task
@@ -198,6 +257,11 @@ class WebAIModeratorBot:
         if self.voice_recognition:
             self.voice_recognition.stop_listening()
         
+        # Stop the voice command consumer
+        if self._voice_consumer_task:
+            self._voice_consumer_task.cancel()
+            self._voice_consumer_task = None
+        
         # Stop multi-platform manager
         if self.multi_platform_manager:
             await self.multi_platform_manager.stop()
@@ -206,6 +270,14 @@ class WebAIModeratorBot:
         await self.broadcast_message("✅ Bot stopped")
         await self.broadcast_status()
     
+    def shutdown_executor(self):
+        """Shut down the default executor installed by start(); only once the server is exiting"""
+        # Not done in stop(): the loop keeps using its default executor (aiohttp DNS lookups
+        # during the next initialize, for one), and a stop/start cycle reuses the same pool
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
     def start_voice(self):
         """Start voice recognition"""
         if self.voice_recognition and self.is_running:
@@ -224,11 +296,28 @@ class WebAIModeratorBot:
     
     def _schedule_coroutine(self, coro):
         """Schedule a coroutine to run in the main event loop from any thread"""
-        if self.event_loop and not self.event_loop.is_closed():
+        loop = self.event_loop
+        if loop and not loop.is_closed():
             try:
-                asyncio.run_coroutine_threadsafe(coro, self.event_loop)
-            except Exception as e:
+                # Nobody waits on the result, so skip run_coroutine_threadsafe's concurrent Future
+                loop.call_soon_threadsafe(self._spawn_task, coro)
+            except RuntimeError as e:
+                coro.close()
                 logger.error(f"Failed to schedule coroutine: {e}")
+        else:
+            coro.close()
+    
+    def _spawn_task(self, coro):
+        """Start a fire-and-forget task on the event loop, keeping it referenced until it finishes"""
+        task = self.event_loop.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._on_background_task_done)
+    
+    def _on_background_task_done(self, task: asyncio.Task):
+        """Drop a finished background task and log any exception it raised"""
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background task failed: {task.exception()}")
 
     def _clear_pending_command(self):
         """Clear the pending command and cancel any cleanup timer"""
@@ -247,8 +336,9 @@ class WebAIModeratorBot:
             logger.debug("Command timeout reached, clearing pending command")
             self._clear_pending_command()
         
-        self._cleanup_timer = Timer(self.command_timeout, cleanup)
-        self._cleanup_timer.start()
+        # Pending commands are only touched on the event loop, so a loop timer replaces the
+        # dedicated threading.Timer thread (and its cross-thread access to pending state)
+        self._cleanup_timer = self.event_loop.call_later(self.command_timeout, cleanup)
     
     def _store_pending_command(self, command_text: str):
         """Store a command that wasn't recognized, waiting for continuation"""
@@ -260,7 +350,7 @@ class WebAIModeratorBot:
         self.last_command_time = datetime.now().isoformat()
         
         self._start_command_timeout()
-        logger.info(f"Stored incomplete command, waiting for continuation: {command_text}")
+        logger.info("Stored incomplete command, waiting for continuation: %s", command_text)
     
     def _combine_with_pending(self, new_text: str) -> str:
         """Combine the pending command with new text"""
@@ -269,7 +359,7 @@ class WebAIModeratorBot:
         
         # Combine the texts
         combined = f"{self.pending_command} {new_text}"
-        logger.debug(f"Combined: '{self.pending_command}' + '{new_text}' = '{combined}'")
+        logger.debug("Combined: '%s' + '%s' = '%s'", self.pending_command, new_text, combined)
         return combined
     
     async def execute_text_command(self, command_text: str):
@@ -279,7 +369,7 @@ class WebAIModeratorBot:
             self.last_command_time = datetime.now().isoformat()
             # [VOICE] and [CMD] logs
             session_logger = None
-            moderation_cmd = self.command_processor.process_command(command_text)
+            moderation_cmd = await self.command_processor.process_command(command_text)
             if moderation_cmd:
                 session_logger = CommandSessionLogger(platform="?", action=moderation_cmd.action, spoken_username=moderation_cmd.original_username or moderation_cmd.username or "-")
                 session_logger.log_voice(command_text)
@@ -304,7 +394,7 @@ class WebAIModeratorBot:
                 else:
                     # If this is a username resolution failure for dangerous actions, notify chat on all relevant platforms
                     if ("username not found in recent chat" in error_msg and 
-                        moderation_cmd.action in ['ban', 'timeout', 'restrict']):
+                        moderation_cmd.action in DANGEROUS_ACTIONS):
                         original_username = moderation_cmd.original_username or moderation_cmd.username
                         # Notify all enabled platforms
                         if self.multi_platform_manager:
@@ -323,107 +413,147 @@ class WebAIModeratorBot:
     
     def _on_voice_command(self, command_text: str):
         """Handle voice commands - called from voice recognition thread"""
+        # Hand the transcript to the event loop right away; parsing (including the OpenAI call)
+        # runs there as a coroutine, so the transcription thread never waits on the network
+        loop = self.event_loop
+        queue = self._voice_queue
+        if loop and queue is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, command_text)
+            except RuntimeError as e:
+                logger.error("Failed to queue voice command: %s", e)
+    
+    async def _voice_command_consumer(self):
+        """Process queued voice transcripts on the event loop, one at a time"""
+        while True:
+            command_text = await self._voice_queue.get()
+            try:
+                await self._handle_voice_command(command_text)
+            except Exception as e:
+                logger.error("Error handling voice command: %s", e)
+            finally:
+                self._voice_queue.task_done()
+    
+    async def _handle_voice_command(self, command_text: str):
+        """Process a transcript on the event loop, combining it with a pending command if needed"""
         try:
             # Only log commands with activation keywords to reduce noise
             has_activation_keyword, _, _ = Config.find_activation_keyword(command_text)
             if has_activation_keyword:
-                logger.info(f"🎤 Voice: '{command_text}'")
+                logger.info("🎤 Voice: '%s'", command_text)
             
             # Check if we have a pending command to combine with
             if self.pending_command:
                 if has_activation_keyword:
                     logger.debug("🔄 Replacing pending command with new one")
                     self._clear_pending_command()
-                    self._process_single_command(command_text, is_combined=False)
+                    await self._process_single_command(command_text, is_combined=False)
                 else:
                     # Combine with the pending command
-                    logger.info(f"🔗 Combining commands")
+                    logger.info("🔗 Combining commands")
                     combined_command = self._combine_with_pending(command_text)
                     self._clear_pending_command()
                     
                     # Process the combined command
-                    self._process_single_command(combined_command, is_combined=True)
+                    await self._process_single_command(combined_command, is_combined=True)
                 return
             
             # Process as a single command
-            self._process_single_command(command_text, is_combined=False)
+            await self._process_single_command(command_text, is_combined=False)
             
         except Exception as e:
-            logger.error(f"Error in voice command handler: {e}")
-            self._schedule_coroutine(self.broadcast_message(f"❌ Error processing voice command: {e}"))
+            logger.error("Error in voice command handler: %s", e)
+            await self.broadcast_message(f"❌ Error processing voice command: {e}")
     
-    def _process_single_command(self, command_text: str, is_combined: bool = False):
+    async def _process_single_command(self, command_text: str, is_combined: bool = False):
         """Process a single command, with logic for handling incomplete commands"""
         try:
             # Only process commands that contain activation keyword OR are combined commands
-            has_activation_keyword, _, _ = Config.find_activation_keyword(command_text)
+            has_activation_keyword, _, keyword_end = Config.find_activation_keyword(command_text)
             
             if not has_activation_keyword and not is_combined:
                 # Regular speech without activation keyword and not a combined command - ignore it
                 return
             
-            # Extract the actual command part after the activation keyword
-            actual_command = command_text
+            # Extract the actual command part after the activation keyword (the match already
+            # covers the punctuation/spaces after it)
             if has_activation_keyword:
-                actual_command = Config.extract_command_after_keyword(command_text)
+                actual_command = command_text[keyword_end:].rstrip()
             else:
-                # This is a combined command, extract command from the combined text
-                actual_command = Config.extract_command_after_keyword(command_text)
-                logger.info(f"🔗 Combined: '{actual_command}'")
+                # This is a combined command without the keyword, use the combined text as is
+                actual_command = command_text
+                logger.info("🔗 Combined: '%s'", actual_command)
             
             # Process the command with AI (only log if we have a command to process)
             if actual_command.strip():
-                logger.info(f"🤖 Processing: '{actual_command}'")
+                logger.info("🤖 Processing: '%s'", actual_command)
+            
+            # Several commands in one breath are parsed together (one OpenAI request at most)
+            processor = self.command_processor
+            command_parts = processor.split_compound_command(actual_command)
+            if len(command_parts) > 1:
+                moderation_cmds = await processor.process_commands(command_parts)
+                self._clear_pending_command()
+                for part, moderation_cmd in zip(command_parts, moderation_cmds):
+                    if moderation_cmd:
+                        await self._dispatch_command(moderation_cmd, part)
+                    else:
+                        await self.broadcast_message(f"❓ Could not understand command: {part}")
+                await self.broadcast_status()
+                return
             
-            moderation_cmd = self.command_processor.process_command(actual_command)
+            moderation_cmd = await processor.process_command(actual_command)
             
             if moderation_cmd:
                 # Clear any pending command since we got a valid result
                 self._clear_pending_command()
-                
-                # Show AI matching result if username was resolved
-                if moderation_cmd.original_username and moderation_cmd.username != moderation_cmd.original_username:
-                    self._schedule_coroutine(self.broadcast_message(f"🤖 AI match: '{moderation_cmd.original_username}' → '{moderation_cmd.username}'"))
-                
-                # Validate the command
-                is_valid, error_msg = self.command_processor.validate_command(moderation_cmd)
-                
-                if is_valid:
-                    self._schedule_coroutine(self._execute_command_async(moderation_cmd, command_text))
-                else:
-                    # If this is a username resolution failure for dangerous actions, notify chat on all relevant platforms
-                    if ("username not found in recent chat" in error_msg and 
-                        moderation_cmd.action in ['ban', 'timeout', 'restrict']):
-                        original_username = moderation_cmd.original_username or moderation_cmd.username
-                        # Notify all enabled platforms
-                        if self.multi_platform_manager:
-                            for platform, bot in self.multi_platform_manager.bots.items():
-                                # Only notify platforms where the command would apply
-                                if hasattr(bot, 'send_username_not_found_message'):
-                                    # Schedule the coroutine for async method
-                                    self._schedule_coroutine(bot.send_username_not_found_message(original_username, moderation_cmd.action))
-                    self._schedule_coroutine(self.broadcast_message(f"❌ Invalid command: {error_msg}"))
+                await self._dispatch_command(moderation_cmd, command_text)
             else:
                 # Command not recognized
                 if is_combined:
                     # If this was a combined command and still failed, give up
-                    self._schedule_coroutine(self.broadcast_message(f"❓ Could not understand combined command: {actual_command}"))
+                    await self.broadcast_message(f"❓ Could not understand combined command: {actual_command}")
                 elif has_activation_keyword:
                     # Store incomplete commands that contain the activation keyword
                     # This includes cases where someone just says "hey brian" with no command text
                     self._store_pending_command(command_text)
                     if actual_command.strip():
-                        logger.info(f"⏳ Waiting for more: '{actual_command}'")
+                        logger.info("⏳ Waiting for more: '%s'", actual_command)
                     else:
-                        logger.info(f"⏳ Activation keyword detected, waiting for command")
+                        logger.info("⏳ Activation keyword detected, waiting for command")
                     # Don't broadcast the "could not understand" message yet, wait for the next sentence
             
             # Update status but don't broadcast it to reduce noise
-            self._schedule_coroutine(self.broadcast_status())
+            await self.broadcast_status()
             
         except Exception as e:
-            logger.error(f"Error processing command: {e}")
-            self._schedule_coroutine(self.broadcast_message(f"❌ Error processing command: {e}"))
+            logger.error("Error processing command: %s", e)
+            await self.broadcast_message(f"❌ Error processing command: {e}")
+    
+    async def _dispatch_command(self, moderation_cmd: ModerationCommand, command_text: str):
+        """Validate a parsed voice command and start executing it, or report why it can't run"""
+        # Show AI matching result if username was resolved
+        if moderation_cmd.original_username and moderation_cmd.username != moderation_cmd.original_username:
+            await self.broadcast_message(f"🤖 AI match: '{moderation_cmd.original_username}' → '{moderation_cmd.username}'")
+        
+        # Validate the command
+        is_valid, error_msg = self.command_processor.validate_command(moderation_cmd)
+        
+        if is_valid:
+            self._spawn_task(self._execute_command_async(moderation_cmd, command_text))
+        else:
+            # If this is a username resolution failure for dangerous actions, notify chat on all relevant platforms
+            if ("username not found in recent chat" in error_msg and 
+                moderation_cmd.action in DANGEROUS_ACTIONS):
+                original_username = moderation_cmd.original_username or moderation_cmd.username
+                # Notify all enabled platforms
+                if self.multi_platform_manager:
+                    for platform, bot in self.multi_platform_manager.bots.items():
+                        # Only notify platforms where the command would apply
+                        if hasattr(bot, 'send_username_not_found_message'):
+                            # Schedule the coroutine for async method
+                            self._spawn_task(bot.send_username_not_found_message(original_username, moderation_cmd.action))
+            await self.broadcast_message(f"❌ Invalid command: {error_msg}")
     
     async def _execute_command_async(self, cmd: ModerationCommand, original_command: str):
         """Execute a moderation command asynchronously"""
@@ -443,11 +573,7 @@ class WebAIModeratorBot:
                 
                 # Report results for each platform
                 for platform, success in results.items():
-                    platform_name = platform.value
-                    if success:
-                        await self.broadcast_message(f"✅ {platform_name}: {actual_command}")
-                    else:
-                        await self.broadcast_message(f"❌ {platform_name}: {actual_command}")
+                    await self.broadcast_message(f"{_STATUS_ICON[success]} {platform.value}: {actual_command}")
             else:
                 await self.broadcast_message(f"❌ Multi-platform manager not initialized")
         except Exception as e:
@@ -455,8 +581,7 @@ class WebAIModeratorBot:
     
     def _on_command_executed(self, cmd: ModerationCommand, success: bool):
         """Callback for when a command is executed"""
-        status = "✅ SUCCESS" if success else "❌ FAILED"
-        logger.info(f"Command execution {status}: {cmd.action} on {cmd.username}")
+        logger.info("Command execution %s: %s on %s", _STATUS[success], cmd.action, cmd.username)
     
     def get_status(self) -> BotStatus:
         """Get current bot status"""
@@ -594,7 +719,6 @@ async def websocket_endpoint(websocket: WebSocket):
 @app.get("/", response_class=FileResponse)
 async def get_index():
     """Serve the main web interface"""
-    import os
     # Get the absolute path to frontend.html
     frontend_path = os.path.join(os.path.dirname(__file__), "frontend.html")
     return FileResponse(frontend_path)
@@ -614,10 +738,16 @@ async def stop_platform(request: Dict[str, str]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+_STARTUP_BANNER = "\n".join([
+    "🌐 Starting Multi-Platform AI Moderator Bot Web Interface...",
+    "📱 Open your browser to: http://localhost:8000",
+    "🎤 Configure your platforms and channels to start moderating!",
+    "🤖 Supports Twitch and Kick.com!",
+    "",
+])
+
 if __name__ == "__main__":
-    print("🌐 Starting Multi-Platform AI Moderator Bot Web Interface...")
-    print("📱 Open your browser to: http://localhost:8000")
-    print("🎤 Configure your platforms and channels to start moderating!")
-    print("🤖 Supports Twitch and Kick.com!")
+    sys.stdout.write(_STARTUP_BANNER)
+    sys.stdout.flush()
     
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info") 
\ No newline at end of file